@@ -15,19 +15,92 @@ import bpy
 import math
 import mathutils
 from mathutils import Vector, Matrix
-import bpy_extras
-from bpy_extras.object_utils import world_to_camera_view
+from bpy.app.handlers import persistent
 import os
 from xml.etree import ElementTree as ET
 import numpy as np
 import bmesh
 import csv
+import io
+import struct
+import itertools
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import zipfile
+import zlib
+import shutil
+import tempfile
+import time
+import contextlib
+import json
+import sys
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+import multiprocessing
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    # python < 3.8
+    shared_memory = None
 import measureit
 from addon_utils import check,paths,enable
 
 
 addon_keymaps = []
 
+# -----------------------------------------------------------------
+# Instrumentation. Console output and timings are only collected when
+# enabled with settings.debug, console I/O is slow on big imports
+recon_debug = False
+
+TIMINGS_KEEP = 1000
+timings = collections.deque(maxlen=TIMINGS_KEEP)    # {'name', 'seconds', 'time', 'peak_mb'}
+counters = collections.Counter()
+
+def debug(*args):
+    if recon_debug:
+        print(*args)
+
+
+def count(name, n=1):
+    # counted once per operation so kept always, batch script checks them
+    counters[name] += n
+
+
+def peak_memory():
+    """Peak resident memory of blender process in MB, None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on mac
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+@contextlib.contextmanager
+def span(name):
+    """Record duration of the enclosed block"""
+    if not recon_debug:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        timings.append({'name': name, 'seconds': seconds, 'time': time.time(), 'peak_mb': peak_memory()})
+        print('{:s}: {:.3f} ms'.format(name, seconds * 1000))
+
+
+def debug_update(self, context):
+    global recon_debug
+    recon_debug = self.debug
+
+
 def get_bg_image(camera):
     bg = None
     for bg_image in camera.data.background_images:
@@ -35,21 +108,266 @@ def get_bg_image(camera):
             if bg_image.image.name == camera.name:
                 bg = bg_image
                 break
+        elif 'img_path' in camera.data:
+            # photo loaded on demand, see load_camera_image()
+            bg = bg_image
     return bg
 
-    
-    
+
+def get_image_size(camera, bg=None):
+    """Original photo size in pixels"""
+    if 'img_size' in camera.data:
+        return tuple(camera.data['img_size'])
+    if not bg:
+        bg = get_bg_image(camera)
+    if bg and bg.image:
+        return tuple(bg.image.size)
+    return None
+
+
+# -----------------------------------------------------------------
+# Photos loaded on demand. Least recently used ones are unloaded
+# to keep memory within budget
+photo_cache = collections.OrderedDict()     # image name: (bytes, image pointer)
+photo_cache_size = 0
+
+def photo_cache_drop(name):
+    global photo_cache_size
+    photo_cache_size -= photo_cache.pop(name, (0, None))[0]
+
+
+def photo_cache_rebuild():
+    # load and undo replace image data blocks. Track loaded photos of new ones,
+    # keeping previous use order for known names so budget stays enforced
+    global photo_cache_size
+    order = {name: index for index, name in enumerate(photo_cache)}
+    images = [img for img in bpy.data.images if 'recon_level' in img and img.has_data and not img.packed_file]
+    images.sort(key=lambda img: order.get(img.name, len(order)))
+    photo_cache.clear()
+    photo_cache_size = 0
+    for img in images:
+        w, h = img.size
+        photo_cache[img.name] = (w * h * 4, img.as_pointer())
+        photo_cache_size += photo_cache[img.name][0]
+
+
+def photo_cache_add(img, size, budget_mb):
+    global photo_cache_size
+    photo_cache_drop(img.name)
+    photo_cache[img.name] = (size[0] * size[1] * 4, img.as_pointer())
+    photo_cache_size += photo_cache[img.name][0]
+
+    while photo_cache_size > budget_mb * 1024 * 1024 and len(photo_cache) > 1:
+        name, (nbytes, pointer) = next(iter(photo_cache.items()))
+        photo_cache_drop(name)
+        old = bpy.data.images.get(name)
+        # only the same image loaded by addon, never user's one with same name
+        if old and old.as_pointer() == pointer and 'recon_level' in old and not old.packed_file:
+            debug('Unloading photo '+name)
+            bpy.data.images.remove(old)
+
+
+def load_camera_image(cam, full=False):
+    """Attach photo to camera imported with 'Load on demand'.
+    Downscaled preview is used first if available, see build_image_proxies()"""
+    if not 'img_path' in cam.data:
+        return
+    bg = get_bg_image(cam)
+    if not bg:
+        return
+
+    settings = bpy.context.scene.recon_settings
+    level = 1 if full else int(settings.image_proxy)
+    w, h = get_image_size(cam, bg) or (0, 0)
+
+    if bg.image:
+        loaded = bg.image.get('recon_level', 1)
+        if loaded <= level:
+            if bg.image.name in photo_cache:
+                photo_cache.move_to_end(bg.image.name)
+            else:
+                photo_cache_add(bg.image, (w//loaded, h//loaded), settings.image_cache_mb)
+            return
+
+        # replace preview with full resolution photo
+        photo_cache_drop(bg.image.name)
+        bpy.data.images.remove(bg.image)
+
+    path, level = get_camera_photo_path(cam, level, settings)
+    if settings.nav_prefetch and not full:
+        prefetch_check(path)
+
+    img = bpy.data.images.get(cam.name)
+    if img:
+        level = img.get('recon_level', 1)
+    else:
+        debug('Loading photo '+path)
+        img = bpy.data.images.load(path, check_existing=True)
+        img.name = cam.name
+        img['recon_level'] = level
+    bg.image = img
+    photo_cache_add(img, (w//level, h//level), settings.image_cache_mb)
+
+    if level > 1 and settings.nav_full_delay > 0:
+        bpy.app.timers.register(functools.partial(load_full_delayed, cam.name), first_interval=settings.nav_full_delay)
+
+
+def get_camera_photo_path(cam, level, settings):
+    """Photo file for camera: cached preview of level or full size one"""
+    path = cam.data['img_path']
+    if level > 1:
+        proxy = get_proxy_path(path, level, get_proxy_dir(settings))
+        if proxy and os.path.exists(proxy):
+            return proxy, level
+    return path, 1
+
+
+def load_full_delayed(name):
+    # swap preview to full resolution if user still looks through this camera
+    scene = bpy.context.scene
+    if scene.camera and scene.camera.name == name:
+        load_camera_image(scene.camera, full=True)
+    return None
+
+
+# -----------------------------------------------------------------
+# Background reading of photos for cameras likely to be shown next.
+# Files are read in thread so they are already in OS file cache
+# when load_camera_image() needs them
+prefetch_pool = None
+prefetch_timer = None
+prefetch_pending = collections.OrderedDict()    # path: future
+prefetch_stats = {'hits': 0, 'misses': 0}
+
+PREFETCH_KEEP = 64
+
+def warm_file(path):
+    with open(path, 'rb') as f:
+        while f.read(1 << 20):
+            pass
+
+
+def prefetch_photos(paths):
+    global prefetch_pool
+    if prefetch_pool is None:
+        prefetch_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+    for path in paths:
+        if not path in prefetch_pending:
+            prefetch_pending[path] = prefetch_pool.submit(warm_file, path)
+
+    while len(prefetch_pending) > PREFETCH_KEEP:
+        prefetch_pending.popitem(last=False)
+
+
+def prefetch_check(path):
+    # photo is needed now, was it read in advance?
+    future = prefetch_pending.pop(path, None)
+    if future and future.done():
+        prefetch_stats['hits'] += 1
+    else:
+        prefetch_stats['misses'] += 1
+
+
+def prefetch_run(sel):
+    global prefetch_timer
+    prefetch_timer = None
+    scene = bpy.context.scene
+    settings = scene.recon_settings
+    if not settings.image_lazy or not scene.camera or not 'img_path' in scene.camera.data:
+        return None
+    if not settings.nav_filter_visible:
+        sel = None
+
+    # predict next switches in both directions same way as Recon_SwitchCamera
+    paths = []
+    level = int(settings.image_proxy)
+    for direction in ['next', 'prev']:
+        candidates = None
+        if settings.nav_graph:
+            candidates = nav_graph_candidates(scene, settings, direction)
+        if candidates is not None:
+            found = (candidates[0] + candidates[1])[:settings.nav_prefetch]
+        else:
+            skip = ()
+            if direction == nav_last_dir and not settings.nav_sort_mode in ['none']:
+                skip = set(nav_loop_filter)
+            found, current = nav_find_cameras(scene, settings, direction, sel, skip, settings.nav_prefetch)
+        for cam in found:
+            bg = get_bg_image(cam)
+            if 'img_path' in cam.data and bg and not bg.image:
+                paths.append(get_camera_photo_path(cam, level, settings)[0])
+
+    debug('Prefetch {:d} photos'.format(len(paths)))
+    prefetch_photos(paths)
+    return None
+
+
+def prefetch_schedule(sel):
+    # predict after view is redrawn to keep hotkey response fast
+    global prefetch_timer
+    if prefetch_timer and bpy.app.timers.is_registered(prefetch_timer):
+        bpy.app.timers.unregister(prefetch_timer)
+    prefetch_timer = functools.partial(prefetch_run, sel)
+    bpy.app.timers.register(prefetch_timer, first_interval=0.1)
+
+
+# -----------------------------------------------------------------
+# On-disk cache of downscaled photos
+def get_proxy_dir(settings):
+    if settings.image_proxy_dir:
+        return bpy.path.abspath(settings.image_proxy_dir)
+    return os.path.join(tempfile.gettempdir(), 'recon_proxy')
+
+
+def get_proxy_path(img_path, level, proxy_dir):
+    """Preview file name keyed by source path and modification time"""
+    try:
+        mtime = os.stat(img_path).st_mtime_ns
+    except OSError:
+        return None
+    key = hashlib.sha1('{:s}|{:d}'.format(os.path.abspath(img_path), mtime).encode('utf-8')).hexdigest()
+    return os.path.join(proxy_dir, '{:s}_{:d}.jpg'.format(key, level))
+
+
+PROXY_LEVELS = (2, 4, 8)
+
+def build_image_proxies(img_path, proxy_dir):
+    """Write 1/2, 1/4, 1/8 downscaled copies of photo unless cached already"""
+    paths = {level: get_proxy_path(img_path, level, proxy_dir) for level in PROXY_LEVELS}
+    if all(os.path.exists(path) for path in paths.values()):
+        return
+
+    os.makedirs(proxy_dir, exist_ok=True)
+    img = bpy.data.images.load(img_path, check_existing=False)
+    w, h = img.size
+    try:
+        # each level is downscaled from previous one
+        for level in PROXY_LEVELS:
+            img.scale(max(1, w//level), max(1, h//level))
+            if not os.path.exists(paths[level]):
+                img.filepath_raw = paths[level]
+                img.file_format = 'JPEG'
+                img.save()
+    finally:
+        bpy.data.images.remove(img)
+
+
 # -----------------------------------------------------------------
 def show_camera(scene, cam, pivot = False):
+    with span('show_camera.load'):
+        load_camera_image(cam)
     cam.data.show_background_images = True
     cam.data.show_limits = False
     cam.data.show_passepartout = False
     cam.data.show_name = True
     cam.hide_set(False)
     scene.camera = cam
-    print('Switching to camera: '+cam.name)
+    debug('Switching to camera: '+cam.name)
     r3d = False
-    for area in bpy.context.screen.areas:
+    # no screen when running in background
+    screen = bpy.context.screen
+    for area in (screen.areas if screen else []):
         if area.type == 'VIEW_3D':
             r3d = area.spaces[0].region_3d
             break
@@ -64,7 +382,8 @@ def show_camera(scene, cam, pivot = False):
 
             # refresh hack to let region_3d to setup matrices
 #            area.tag_redraw()
-            bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
+            with span('show_camera.redraw'):
+                bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
     
             # point to view
             c = r3d.perspective_matrix @ Vector(( pivot[0], pivot[1], pivot[2], 1.0))
@@ -95,33 +414,34 @@ def adjust_render_resolution(cam):
     try:
         f = cam.data['f']
         bg = get_bg_image(cam)
-        if bg:
+        size = get_image_size(cam, bg)
+        if bg and size:
             # TODO adjust camera to fit rotated image
             # image first fit to camera (bg_image.frame_method) than rotate
             # how to adjust render resolution to fit _rotated_ image which size depend on render resolution???
             # how to calc FOV for such camera????
             #
             """
-            a = rotate_2d([bg.image.size[0],bg.image.size[1]], bg.rotation)
-            b = rotate_2d([-bg.image.size[0],bg.image.size[1]], bg.rotation)
+            a = rotate_2d([size[0],size[1]], bg.rotation)
+            b = rotate_2d([-size[0],size[1]], bg.rotation)
             w = max(abs(a[0]), abs(b[0]))
             h = max(abs(a[1]), abs(b[1]))
-            print('{:f} x {:f}'.format(w,h))
+            debug('{:f} x {:f}'.format(w,h))
             bpy.context.scene.render.resolution_x = w
             bpy.context.scene.render.resolution_y = h
             cam.data.angle = 2*math.atan(w/2/f)
             """
             if ('rotate_hack' in cam.data) and (cam.data['rotate_hack']):
-                bpy.context.scene.render.resolution_x = bg.image.size[1]
-                bpy.context.scene.render.resolution_y = bg.image.size[0]
-                bg.scale= bg.image.size[1]/bg.image.size[0]
+                bpy.context.scene.render.resolution_x = size[1]
+                bpy.context.scene.render.resolution_y = size[0]
+                bg.scale= size[1]/size[0]
             else:
-                bpy.context.scene.render.resolution_x = bg.image.size[0]
-                bpy.context.scene.render.resolution_y = bg.image.size[1]
+                bpy.context.scene.render.resolution_x = size[0]
+                bpy.context.scene.render.resolution_y = size[1]
                 bg.scale=1
             # bg_image.frame_method = CROP
             # camera.sensor_fit = auto 
-            cam.data.angle = 2*math.atan(max(bg.image.size)/2/f)
+            cam.data.angle = 2*math.atan(max(size)/2/f)
             return True
         
     except KeyError:
@@ -133,47 +453,777 @@ def adjust_render_resolution(cam):
 
 # -----------------------------------------------------------------
 def get_selected_vertices():
-    if bpy.context.active_object and bpy.context.active_object.type == 'MESH':
-        obj = bpy.context.active_object
-        mat_world = obj.matrix_world
+    """World coordinates of active mesh selected vertices as (N,3) array"""
+    obj = bpy.context.active_object
+    if not obj or obj.type != 'MESH':
+        return np.empty((0, 3))
 
-        mode = obj.mode
-        # we need to switch from Edit mode to Object mode so the selection gets updated
-        bpy.ops.object.mode_set(mode='OBJECT')
-        selectedVerts = [mat_world @ v.co for v in obj.data.vertices if v.select]
-        # back to whatever mode we were in
-        bpy.ops.object.mode_set(mode=mode)
-    
-        return selectedVerts
-    else:
-        return []
+    if obj.mode == 'EDIT':
+        # write edit mesh to mesh data so the selection gets updated, no mode switching
+        obj.update_from_editmode()
+
+    verts = obj.data.vertices
+    select = np.empty(len(verts), dtype=bool)
+    verts.foreach_get('select', select)
+    co = np.empty(len(verts)*3, dtype=np.float32)
+    verts.foreach_get('co', co)
+    co = co.reshape((-1, 3))[select].astype(np.float64)
+
+    m = np.array(obj.matrix_world)
+    return co @ m[:3, :3].T + m[:3, 3]
 
 
 # -----------------------------------------------------------------
-def is_visible(verts_co, cam):
-    scene = bpy.context.scene
-    cs, ce = cam.data.clip_start, cam.data.clip_end
-    res = False
-    
+def get_camera_frame(scene, cam):
+    """Camera view frame borders (min_x, max_x, min_y, max_y) in camera space.
+    Perspective frames are given at unit distance. Same frame as world_to_camera_view()
+    gets after adjust_render_resolution(), but without touching scene render settings
+    when possible"""
+    f = cam.data.get('f')
+    bg = get_bg_image(cam)
+    size = get_image_size(cam, bg)
+    if f and bg and size and cam.data.type == 'PERSP' and cam.data.sensor_fit == 'AUTO':
+        w, h = size
+        if cam.data.get('rotate_hack'):
+            w, h = h, w
+        if w and h:
+            # sensor fit AUTO: larger side spans camera angle set by adjust_render_resolution()
+            aw = w * scene.render.pixel_aspect_x
+            ah = h * scene.render.pixel_aspect_y
+            half = max(w, h)/2/f
+            hx = half * aw / max(aw, ah)
+            hy = half * ah / max(aw, ah)
+            sx = cam.data.shift_x * 2 * max(hx, hy)
+            sy = cam.data.shift_y * 2 * max(hx, hy)
+            return (sx - hx, sx + hx, sy - hy, sy + hy)
+
+    # fallback to blender frame calculation
     adjust_render_resolution(cam)
-    
-    for v in verts_co:
-        co_ndc = world_to_camera_view(scene, cam, v)
-        #check wether point is inside frustum
-        if (0.0 < co_ndc.x < 1.0 and
-            0.0 < co_ndc.y < 1.0 and
-            cs < co_ndc.z):
-#            cs < co_ndc.z <  ce):
-                res = True
-                break
-            
+    frame = cam.data.view_frame(scene=scene)
+    d = 1.0
+    if cam.data.type != 'ORTHO':
+        d = -frame[0].z
+    return (frame[2].x/d, frame[1].x/d, frame[1].y/d, frame[0].y/d)
+
+
+# -----------------------------------------------------------------
+def get_camera_projection(scene, cam):
+    """4x4 matrix from world to homogeneous camera frame coords.
+    Point is inside frame if 0 < x/w < 1, 0 < y/w < 1 and z > clip_start"""
+    min_x, max_x, min_y, max_y = get_camera_frame(scene, cam)
+    sx = 1.0/(max_x - min_x)
+    sy = 1.0/(max_y - min_y)
+    if cam.data.type == 'ORTHO':
+        m = np.array(( (sx, 0, 0, -min_x*sx), (0, sy, 0, -min_y*sy), (0, 0, -1, 0), (0, 0, 0, 1) ))
+    else:
+        m = np.array(( (sx, 0, min_x*sx, 0), (0, sy, min_y*sy, 0), (0, 0, -1, 0), (0, 0, -1, 0) ))
+    return m @ np.array(cam.matrix_world.normalized().inverted())
+
+
+# max number of camera * vertex pairs to project at once
+VISIBILITY_BLOCK = 1 << 22
+
+def cameras_see_points(scene, cams, verts_co):
+    """Vectorized frustum test. Returns bool array, True for cameras which
+    see at least one of verts_co"""
+    res = np.zeros(len(cams), dtype=bool)
+    pts = np.asarray(verts_co, dtype=np.float64).reshape(-1, 3)
+    if len(cams) == 0 or len(pts) == 0:
+        return res
+    pts = np.hstack(( pts, np.ones((len(pts), 1)) )).T
+
+    # precomputed index excludes cameras which can not see selection at all
+    check = np.arange(len(cams))
+    candidates = covis_candidates(scene, cams, pts[:3].T)
+    if candidates is not None:
+        check = check[candidates]
+        debug('Covisibility candidates: {:d}'.format(len(check)))
+
+    # fallback frame calculation may change render resolution
+    render = scene.render
+    resolution = (render.resolution_x, render.resolution_y)
+    proj = np.array([get_camera_projection(scene, cams[i]) for i in check]).reshape((-1, 4, 4))
+    clip = np.array([cams[i].data.clip_start for i in check])
+    if resolution != (render.resolution_x, render.resolution_y):
+        render.resolution_x, render.resolution_y = resolution
+
+    step = max(1, VISIBILITY_BLOCK // pts.shape[1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(0, len(check), step):
+            h = proj[i:i+step] @ pts
+            x = h[:, 0] / h[:, 3]
+            y = h[:, 1] / h[:, 3]
+            inside = (0.0 < x) & (x < 1.0) & (0.0 < y) & (y < 1.0) & (clip[i:i+step, None] < h[:, 2])
+            res[check[i:i+step]] = inside.any(axis=1)
+
     return res
 
+
+# -----------------------------------------------------------------
+def is_visible(verts_co, cam):
+    return cameras_see_points(bpy.context.scene, [cam], verts_co)[0]
+
+
+# -----------------------------------------------------------------
+# Occlusion test against reference mesh. BVH tree is built in world space
+# once and kept until reference mesh changes. Depsgraph reports geometry update
+# on every update_from_editmode() so tree is only marked to be checked then
+ref_bvh = None    # (reference name, tree, signature)
+ref_bvh_dirty = False
+
+# ray stops this fraction of distance before the point so surface the point lies on does not hide it
+OCCLUSION_EPS = 1e-3
+
+def ref_bvh_invalidate():
+    global ref_bvh
+    ref_bvh = None
+
+
+def ref_bvh_changed():
+    global ref_bvh_dirty
+    ref_bvh_dirty = True
+
+
+def ref_mesh_signature(objects):
+    """Vertex and polygon counts, coordinates checksum and placement of meshes"""
+    sig = []
+    for obj in objects:
+        verts = obj.data.vertices
+        co = np.empty(len(verts)*3, dtype=np.float32)
+        verts.foreach_get('co', co)
+        sig.append((obj.name, len(verts), len(obj.data.polygons), zlib.crc32(co), tuple(map(tuple, obj.matrix_world))))
+    return sig
+
+
+def get_ref_bvh(settings):
+    global ref_bvh, ref_bvh_dirty
+    ref = get_ref_id(settings)
+    if ref is None:
+        return None
+    objects = get_ref_objects(ref)
+    if ref_bvh is not None and ref_bvh_dirty:
+        # rebuild only if mesh really changed
+        ref_bvh_dirty = False
+        if ref_bvh[2] != ref_mesh_signature(objects):
+            ref_bvh = None
+    if ref_bvh is None or ref_bvh[0] != ref.name:
+        verts = []
+        tris = []
+        offset = 0
+        for obj in objects:
+            mesh = obj.data
+            mesh.calc_loop_triangles()
+            t = np.empty(len(mesh.loop_triangles)*3, dtype=np.int32)
+            mesh.loop_triangles.foreach_get('vertices', t)
+            co = get_mesh_vertices(obj)
+            verts.append(co)
+            tris.append(t.reshape((-1, 3)) + offset)
+            offset += len(co)
+        if not verts:
+            return None
+        tree = mathutils.bvhtree.BVHTree.FromPolygons(np.concatenate(verts).tolist(), np.concatenate(tris).tolist(), all_triangles=True)
+        ref_bvh = (ref.name, tree, ref_mesh_signature(objects))
+        ref_names_update(ref, objects)
+        ref_bvh_dirty = False
+        debug('Reference BVH built: {:d} triangles'.format(sum(len(t) for t in tris)))
+    return ref_bvh[1]
+
+
+def sees_unoccluded(scene, settings, cam, verts_co):
+    """Camera sees at least nav_occlusion_min of verts_co not hidden by reference mesh.
+    At most nav_occlusion_rays points inside camera frame are tested"""
+    tree = get_ref_bvh(settings)
+    if tree is None:
+        return True
+
+    render = scene.render
+    resolution = (render.resolution_x, render.resolution_y)
+    h = get_camera_projection(scene, cam) @ np.hstack(( verts_co, np.ones((len(verts_co), 1)) )).T
+    if resolution != (render.resolution_x, render.resolution_y):
+        render.resolution_x, render.resolution_y = resolution
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = h[0] / h[3]
+        y = h[1] / h[3]
+        pts = verts_co[(0.0 < x) & (x < 1.0) & (0.0 < y) & (y < 1.0) & (cam.data.clip_start < h[2])]
+    if len(pts) > settings.nav_occlusion_rays:
+        pts = pts[np.linspace(0, len(pts) - 1, settings.nav_occlusion_rays).astype(int)]
+
+    need = min(settings.nav_occlusion_min, len(pts))
+    if need == 0:
+        return False
+    origin = cam.matrix_world.translation
+    seen = 0
+    for p in pts:
+        ray = Vector(p) - origin
+        dist = ray.length
+        if dist > 0:
+            location, normal, index, hit = tree.ray_cast(origin, ray / dist, dist * (1.0 - OCCLUSION_EPS))
+            if location is not None:
+                continue
+        seen += 1
+        if seen >= need:
+            return True
+    return False
+
+
+def occlusion_filter(scene, settings, cams, sel):
+    """Yield cameras from cams which are not occluded. Lazy so callers stop after enough cameras"""
+    occlusion = settings.nav_filter_occlusion and sel is not None and len(sel)
+    for cam in cams:
+        if not occlusion or sees_unoccluded(scene, settings, cam, sel):
+            yield cam
+
+
+def filter_visible(scene, settings, cams, sel, occlusion=True):
+    """Cameras from cams which see selected vertices, order is kept"""
+    if sel is None or not len(sel) or not cams:
+        return list(cams)
+    visible = cameras_see_points(scene, cams, sel)
+    cams = [c for c, v in zip(cams, visible) if v]
+    if occlusion:
+        cams = list(occlusion_filter(scene, settings, cams, sel))
+    return cams
+
+
+# -----------------------------------------------------------------
+# Covisibility index. Space around reference mesh is split into voxel cells,
+# each cell occupied by mesh keeps list of cameras which frustum touches it.
+# Lists are stored in CSR form in .npz file next to .blend, custom property
+# of reference object/collection only keeps file name
+COVIS_PROP = 'recon_covis'
+
+covis_cache = {}    # reference name: loaded index
+
+def get_ref_id(settings):
+    """Reference object or collection"""
+    return bpy.data.objects.get(settings.ref_mesh) or bpy.data.collections.get(settings.ref_mesh)
+
+
+def get_ref_objects(ref):
+    if isinstance(ref, bpy.types.Collection):
+        return [obj for obj in ref.all_objects if obj.type == 'MESH']
+    if ref and ref.type == 'MESH':
+        return [ref]
+    return []
+
+
+# names of reference mesh objects, kept so depsgraph handler does not scan collection on every update
+ref_names = None    # (reference name, set of object names)
+
+def ref_names_update(ref, objects):
+    global ref_names
+    ref_names = (ref.name, {obj.name for obj in objects})
+
+
+def ref_names_invalidate():
+    global ref_names
+    ref_names = None
+
+
+def get_ref_names(ref):
+    if ref_names is None or ref_names[0] != ref.name:
+        ref_names_update(ref, get_ref_objects(ref))
+    return ref_names[1]
+
+
+def get_mesh_vertices(obj):
+    """World coordinates of all mesh vertices as (N,3) array"""
+    verts = obj.data.vertices
+    co = np.empty(len(verts)*3, dtype=np.float32)
+    verts.foreach_get('co', co)
+    m = np.array(obj.matrix_world)
+    return co.reshape((-1, 3)).astype(np.float64) @ m[:3, :3].T + m[:3, 3]
+
+
+def build_covis(scene, settings):
+    """Build covisibility index for reference mesh. Returns number of cells or None"""
+    ref = get_ref_id(settings)
+    objects = get_ref_objects(ref)
+    if not objects:
+        return None
+    co = np.concatenate([get_mesh_vertices(obj) for obj in objects])
+    if not len(co):
+        return None
+
+    origin = co.min(axis=0)
+    cell = max(float((co.max(axis=0) - origin).max()) / settings.covis_resolution, 1e-6)
+    dims = np.floor((co.max(axis=0) - origin) / cell).astype(np.int64) + 1
+    cells = np.floor((co - origin) / cell).astype(np.int64)
+    keys = np.unique((cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2])
+
+    ijk = np.stack((keys // (dims[1]*dims[2]), keys // dims[2] % dims[1], keys % dims[2]), axis=1)
+    centers = origin + (ijk + 0.5) * cell
+    half = np.full(3, cell / 2)
+
+    reg = get_cam_registry(scene)
+    if not reg.cams:
+        return None
+    render = scene.render
+    resolution = (render.resolution_x, render.resolution_y)
+    rows = []
+    cols = []
+    for index, cam in enumerate(reg.cams):
+        # frustum planes in homogeneous coords: x > 0, w - x > 0, y > 0, w - y > 0, z - clip > 0
+        m = get_camera_projection(scene, cam)
+        planes = np.array((m[0], m[3] - m[0], m[1], m[3] - m[1], m[2] - (0, 0, 0, cam.data.clip_start)))
+        # cell may be visible if its farthest corner along each plane normal is inside
+        farthest = centers @ planes[:, :3].T + np.abs(planes[:, :3]) @ half + planes[:, 3]
+        visible = np.flatnonzero((farthest > 0).all(axis=1))
+        rows.append(visible)
+        cols.append(np.full(len(visible), index, dtype=np.int32))
+    if resolution != (render.resolution_x, render.resolution_y):
+        render.resolution_x, render.resolution_y = resolution
+
+    # camera indices of each cell: indices[indptr[row]:indptr[row+1]]
+    rows = np.concatenate(rows)
+    indices = np.concatenate(cols)[np.argsort(rows, kind='stable')]
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(keys)))))
+
+    covis_remove_file(ref)
+    folder = bpy.path.abspath('//') if bpy.data.filepath else tempfile.gettempdir()
+    name = '{:s}_{:s}_{:s}.covis.npz'.format(bpy.path.clean_name(bpy.path.display_name_from_filepath(bpy.data.filepath) or 'untitled'),
+                                             bpy.path.clean_name(ref.name), os.urandom(4).hex())
+    path = os.path.join(folder, name)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, names=np.array(reg.names, dtype=str), origin=origin, cell=cell, dims=dims,
+                 keys=keys, indptr=indptr, indices=indices)
+    os.replace(tmp, path)
+
+    ref[COVIS_PROP] = {
+        'file': '//'+name if bpy.data.filepath else path,
+        'cells': len(keys),
+        'cameras': len(reg.cams),
+        }
+    covis_cache.pop(ref.name, None)
+    ref_names_update(ref, objects)
+    print('Covisibility index: {:d} cells, {:d} cameras, {:d} links'.format(len(keys), len(reg.cams), len(indices)))
+    return len(keys)
+
+
+def get_covis(settings):
+    ref = get_ref_id(settings)
+    # index of older versions was kept in property itself
+    if ref is None or not COVIS_PROP in ref or not 'file' in ref[COVIS_PROP]:
+        return None
+    path = bpy.path.abspath(ref[COVIS_PROP]['file'])
+    if covis_cache.get(ref.name, {}).get('path') != path:
+        try:
+            with np.load(path) as data:
+                covis_cache[ref.name] = {
+                    'path': path,
+                    'index': {name: i for i, name in enumerate(data['names'].tolist())},
+                    'origin': data['origin'],
+                    'cell': float(data['cell']),
+                    'dims': data['dims'].astype(np.int64),
+                    'keys': data['keys'].astype(np.int64),
+                    'indptr': data['indptr'].astype(np.int64),
+                    'indices': data['indices'],
+                    }
+        except (OSError, ValueError, KeyError) as e:
+            debug('Covisibility index not used: {:s}'.format(str(e)))
+            return None
+    return covis_cache[ref.name]
+
+
+def covis_remove_file(ref):
+    if COVIS_PROP in ref:
+        try:
+            os.remove(bpy.path.abspath(ref[COVIS_PROP]['file']))
+        except (OSError, KeyError):
+            pass
+
+
+def covis_invalidate(settings):
+    ref = get_ref_id(settings)
+    covis_cache.clear()
+    if ref is not None and COVIS_PROP in ref:
+        covis_remove_file(ref)
+        del ref[COVIS_PROP]
+        debug('Covisibility index invalidated')
+
+
+def covis_candidates(scene, cams, verts_co):
+    """Bool array of cams which may see verts_co according to covisibility index.
+    None if index is missing or does not cover all points"""
+    covis = get_covis(scene.recon_settings)
+    if covis is None or not len(verts_co):
+        return None
+
+    cells = np.floor((verts_co - covis['origin']) / covis['cell']).astype(np.int64)
+    dims = covis['dims']
+    if (cells < 0).any() or (cells >= dims).any():
+        return None
+    keys = np.unique((cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2])
+    rows = np.searchsorted(covis['keys'], keys)
+    if (rows >= len(covis['keys'])).any() or (covis['keys'][rows] != keys).any():
+        return None
+
+    # gather camera lists of all touched cells without python loop
+    indptr = covis['indptr']
+    starts = indptr[rows]
+    lengths = indptr[rows+1] - starts
+    gather = np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    seen = np.zeros(len(covis['index']), dtype=bool)
+    seen[covis['indices'][gather]] = True
+    # cameras added after index was built are always checked
+    return np.array([seen[covis['index'][c.name]] if c.name in covis['index'] else True for c in cams], dtype=bool)
+
+
+# -----------------------------------------------------------------
+# Scene cameras cache to avoid scanning scene.objects on every hotkey.
+# Invalidated by depsgraph, load and undo handlers
+class CameraRegistry():
+    def __init__(self, scene):
+        self.scene = scene.name
+        self.objects_count = len(scene.objects)
+        self.cams = [obj for obj in scene.objects if obj.type == 'CAMERA']
+        self.names = [cam.name for cam in self.cams]
+        self.index = {name: index for index, name in enumerate(self.names)}
+        self.directions = [cam.matrix_world.to_quaternion() @ Vector((0.0, 0.0, -1.0)) for cam in self.cams]
+        self.locations = np.array([cam.location for cam in self.cams]).reshape((-1, 3))
+        self.direction_array = np.array(self.directions).reshape((-1, 3))
+        self.tree = None
+        self.graph = {}
+        self.graph_key = None
+        debug('Camera registry rebuilt: {:d}'.format(len(self.cams)))
+
+    def is_valid(self, scene):
+        # cheap check on every use. Renamed and added cameras are caught by depsgraph handler,
+        # deleted ones change objects count
+        return self.scene == scene.name and self.objects_count == len(scene.objects)
+
+    def get(self, name):
+        index = self.index.get(name, -1)
+        if index < 0:
+            return None
+        return self.cams[index]
+
+    def direction(self, cam):
+        # camera view direction, cached while camera does not move
+        index = self.index.get(cam.name, -1)
+        if index < 0 or self.cams[index] != cam:
+            return cam.matrix_world.to_quaternion() @ Vector((0.0, 0.0, -1.0))
+        return self.directions[index]
+
+    def camera_moved(self, index):
+        # refresh one camera instead of rebuilding registry
+        cam = self.cams[index]
+        self.directions[index] = cam.matrix_world.to_quaternion() @ Vector((0.0, 0.0, -1.0))
+        self.direction_array[index] = self.directions[index]
+        self.locations[index] = cam.location
+        self.tree = None
+        # moved camera may be neighbor of any other, lists are cheap to build again
+        self.graph = {}
+
+    def get_tree(self):
+        # KD-tree over camera positions
+        if self.tree is None:
+            self.tree = mathutils.kdtree.KDTree(len(self.cams))
+            for index, cam in enumerate(self.cams):
+                self.tree.insert(cam.location, index)
+            self.tree.balance()
+        return self.tree
+
+    def get_neighbors(self, settings, index):
+        # navigation graph edges of camera for current sort mode and filters, built on first use
+        key = (settings.nav_sort_mode,
+               settings.nav_filter_distance_enable, settings.nav_filter_distance,
+               settings.nav_filter_angle_enable, settings.nav_filter_angle)
+        if self.graph_key != key:
+            self.graph = {}
+            self.graph_key = key
+        if not index in self.graph:
+            self.graph[index] = nav_graph_neighbors(self, settings, index)
+        return self.graph[index]
+
+
+cam_registry = None
+
+def cam_registry_invalidate():
+    global cam_registry
+    cam_registry = None
+
+
+def get_cam_registry(scene):
+    global cam_registry
+    if cam_registry is None or not cam_registry.is_valid(scene):
+        cam_registry = CameraRegistry(scene)
+    return cam_registry
+
+
+NAV_GRAPH_NEIGHBORS = 8
+
+def k_smallest(index, key, k):
+    """k items of index with smallest key ordered by key"""
+    if len(index) > k:
+        part = np.argpartition(key, k)[:k]
+        index, key = index[part], key[part]
+    return index[np.argsort(key, kind='stable')]
+
+
+def nav_graph_neighbors(reg, settings, i):
+    """Index arrays of camera i closest neighbors {'next', 'prev'},
+    ordered same way as nav_find_cameras() sorts cameras"""
+    n = len(reg.cams)
+    locations = reg.locations
+    directions = reg.direction_array
+    axis = {'distance': 0, 'camx': 0, 'camy': 1, 'camz': 2}.get(settings.nav_sort_mode)
+
+    if settings.nav_filter_distance_enable:
+        found = reg.get_tree().find_range(locations[i], settings.nav_filter_distance)
+        # found is ordered by distance, scene order is needed below
+        j = np.sort(np.array([index for (pos, index, dist) in found if dist < settings.nav_filter_distance], dtype=int))
+    else:
+        j = np.arange(n)
+    j = j[j != i]
+
+    if settings.nav_filter_angle_enable and settings.nav_filter_angle < 180:
+        j = j[directions[j] @ directions[i] > math.cos(math.radians(settings.nav_filter_angle))]
+
+    if axis is None:
+        # scene order
+        return {'next': j[j > i][:NAV_GRAPH_NEIGHBORS],
+                'prev': j[j < i][::-1][:NAV_GRAPH_NEIGHBORS]}
+
+    inverted = np.array(reg.cams[i].matrix_world.inverted())
+    local = (locations[j] - locations[i]) @ inverted[:3, :3].T
+    if settings.nav_sort_mode == 'distance':
+        key = np.copysign(np.linalg.norm(locations[j] - locations[i], axis=1), local[:, 0])
+        after = ~np.signbit(key)
+    else:
+        key = local[:, axis]
+        after = key > 0
+    key = np.abs(key)
+    return {'next': k_smallest(j[after], key[after], NAV_GRAPH_NEIGHBORS),
+            'prev': k_smallest(j[~after], key[~after], NAV_GRAPH_NEIGHBORS)}
+
+
+def cams_nearest(scene, co, radius=None):
+    """Yield arrays of camera indices ordered by distance from co, only ones closer
+    than radius if given. Search area grows only while caller keeps asking for more cameras"""
+    reg = get_cam_registry(scene)
+    tree = reg.get_tree()
+    if radius is not None:
+        found = sorted(tree.find_range(co, radius), key=lambda f: f[2])
+        yield np.array([index for (pos, index, dist) in found if dist < radius], dtype=int)
+        return
+    n, done = 16, 0
+    while done < len(reg.cams):
+        found = tree.find_n(co, n)
+        yield np.array([index for (pos, index, dist) in found[done:]], dtype=int)
+        done = len(found)
+        n *= 4
+
+
+@persistent
+def recon_depsgraph_update(scene, depsgraph=None):
+    if depsgraph is None:
+        cam_registry_invalidate()
+        return
+
+    settings = scene.recon_settings
+    ref = get_ref_id(settings)
+    covis = ref is not None and COVIS_PROP in ref
+    watch = ref is not None and (covis or ref_bvh is not None)
+    names = get_ref_names(ref) if watch else ()
+
+    for update in depsgraph.updates:
+        if watch and isinstance(update.id, bpy.types.Collection):
+            # objects may be linked to or unlinked from reference collection
+            ref_names_invalidate()
+            names = get_ref_names(ref)
+        if not isinstance(update.id, bpy.types.Object):
+            continue
+        if update.id.type == 'CAMERA':
+            index = cam_registry.index.get(update.id.name, -1) if cam_registry is not None else -1
+            try:
+                known = index >= 0 and cam_registry.cams[index].as_pointer() == update.id.original.as_pointer()
+            except ReferenceError:
+                # deleted camera replaced by new one with same name
+                known = False
+            if known:
+                if update.is_updated_transform:
+                    cam_registry.camera_moved(index)
+            else:
+                # new or renamed camera, may replace deleted object keeping objects count
+                cam_registry_invalidate()
+            if covis and update.is_updated_transform:
+                covis_invalidate(settings)
+                covis = False
+            continue
+        if update.id.name in names:
+            if update.is_updated_transform or update.is_updated_geometry:
+                ref_bvh_changed()
+            # index cells are in world space so mesh editing keeps it valid, but moving does not
+            if covis and update.is_updated_transform:
+                covis_invalidate(settings)
+                covis = False
+
+
+@persistent
+def recon_load_post(dummy):
+    global recon_debug
+    recon_debug = bpy.context.scene.recon_settings.debug
+    cam_registry_invalidate()
+    ref_bvh_invalidate()
+    ref_names_invalidate()
+    covis_cache.clear()
+    photo_cache_rebuild()
+
+
+@persistent
+def recon_undo_post(dummy):
+    # undo reloads data blocks so cached objects are gone
+    cam_registry_invalidate()
+    ref_bvh_invalidate()
+    ref_names_invalidate()
+    covis_cache.clear()
+    photo_cache_rebuild()
+
             
 # -----------------------------------------------------------------
 nav_last_dir = 'unknown'
 nav_loop_filter = []    
 
+def nav_find_cameras(scene, settings, direction, sel, skip=(), count=1):
+    """Cameras to switch to in direction ('next' or 'prev') according to sort mode and filters.
+    Returns up to count cameras in switching order and whether current camera fits filters"""
+    reg = get_cam_registry(scene)
+
+    # current camera have to pass filters to navigate relative to it
+    # otherwise jump to first matching camera
+    current = scene.camera and reg.get(scene.camera.name) == scene.camera and not scene.camera.name in skip
+    if current:
+        current = len(filter_visible(scene, settings, [scene.camera], sel)) > 0
+
+    radius = settings.nav_filter_distance if current and settings.nav_filter_distance_enable else None
+    if current and settings.nav_filter_angle_enable and settings.nav_filter_angle < 180:
+        min_cos = math.cos(math.radians(settings.nav_filter_angle))
+        cam_direction = reg.direction_array[reg.index[scene.camera.name]]
+    else:
+        min_cos = None
+
+    def candidates(index):
+        # cheap filters first to reduce visibility test. Only cameras of index are visited
+        with span('navigation.filter'):
+            if min_cos is not None:
+                index = index[reg.direction_array[index] @ cam_direction > min_cos]
+            cams = [reg.cams[i] for i in index if not reg.names[i] in skip]
+        # occlusion is tested later only for cameras in switching order
+        with span('navigation.visibility'):
+            return filter_visible(scene, settings, cams, sel, occlusion=False)
+
+    def take(ordered):
+        with span('navigation.occlusion'):
+            return list(itertools.islice(occlusion_filter(scene, settings, ordered, sel), count))
+
+    if current and settings.nav_sort_mode == 'distance':
+        # walk from nearest cameras to first ones at requested side
+        m = scene.camera.matrix_world.inverted()
+        side = -1 if direction == 'prev' else 1
+        ordered = (c for index in cams_nearest(scene, scene.camera.location, radius) for c in candidates(index)
+                   if c != scene.camera and math.copysign(1.0, (m @ c.location).x) == side)
+        return take(ordered), True
+
+    if radius is not None:
+        # cameras in range in scene order
+        cams = candidates(np.sort(next(cams_nearest(scene, scene.camera.location, radius))))
+    else:
+        cams = candidates(np.arange(len(reg.cams)))
+    debug('Cams filtered: {:d}'.format(len(cams)))
+
+    if current and scene.camera.name in {c.name for c in cams}:
+        # sort modes
+        with span('navigation.sort'):
+            if settings.nav_sort_mode == 'camx':
+                m = scene.camera.matrix_world.inverted()
+                cams.sort(key=lambda c:  (m @ c.location).x )
+
+            if settings.nav_sort_mode == 'camy':
+                m = scene.camera.matrix_world.inverted()
+                cams.sort(key=lambda c:  (m @ c.location).y )
+
+            if settings.nav_sort_mode == 'camz':
+                m = scene.camera.matrix_world.inverted()
+                cams.sort(key=lambda c:  (m @ c.location).z )
+
+            # find current camera index
+            index = {c.name: i for i, c in enumerate(cams)}[scene.camera.name]
+        debug('Current camera index: {:d}'.format(index))
+        if direction == 'prev':
+            return take(cams[:index][::-1]), True
+        return take(cams[index+1:]), True
+
+    # no camera selected or current camera does not fit filters => jump to first matching cam
+    return take(cams), False
+
+
+# Graph navigation. Moving back pops cameras visited in opposite direction
+# so Prev exactly returns along the path walked with Next
+nav_history = {'next': [], 'prev': []}    # cameras to return to when moving in direction
+nav_history_cam = ''
+
+NAV_HISTORY_MAX = 1000
+
+def nav_graph_candidates(scene, settings, direction):
+    """Cameras to switch to from current one without visibility check: history first then graph neighbors"""
+    reg = get_cam_registry(scene)
+    if not scene.camera or reg.get(scene.camera.name) != scene.camera:
+        return None
+    if scene.camera.name != nav_history_cam:
+        # camera was changed outside of navigation
+        nav_history['next'].clear()
+        nav_history['prev'].clear()
+
+    opposite = 'prev' if direction == 'next' else 'next'
+    visited = set(nav_history[opposite])
+    back = [reg.get(name) for name in nav_history[direction][::-1]]
+    neighbors = reg.get_neighbors(settings, reg.index[scene.camera.name])[direction]
+    neighbors = [reg.cams[j] for j in neighbors if not reg.names[j] in visited]
+    return [c for c in back if c], neighbors
+
+
+def nav_graph_step(scene, settings, direction, sel):
+    """Camera to switch to using navigation graph. Falls back to full scan if no neighbor fits"""
+    global nav_history_cam
+    opposite = 'prev' if direction == 'next' else 'next'
+    cur = scene.camera
+
+    cam = None
+    candidates = nav_graph_candidates(scene, settings, direction)
+    if candidates is not None:
+        back, neighbors = candidates
+        if back:
+            cam = back[0]
+            while nav_history[direction] and nav_history[direction].pop() != cam.name:
+                pass
+        elif sel is not None and len(sel):
+            if filter_visible(scene, settings, [cur], sel):
+                visible = filter_visible(scene, settings, neighbors, sel, occlusion=False)
+                cam = next(occlusion_filter(scene, settings, visible, sel), None)
+            else:
+                candidates = None
+        elif neighbors:
+            cam = neighbors[0]
+
+    if cam is None:
+        found, current = nav_find_cameras(scene, settings, direction, sel, set(nav_history[opposite]))
+        if not found:
+            return None
+        cam = found[0]
+        if not current:
+            nav_history['next'].clear()
+            nav_history['prev'].clear()
+            cur = None
+
+    if cur:
+        nav_history[opposite].append(cur.name)
+        del nav_history[opposite][:-NAV_HISTORY_MAX]
+    nav_history_cam = cam.name
+    return cam
+
+
 class Recon_SwitchCamera(bpy.types.Operator):
     bl_idname = "reconstruction.switch_cam"        # Unique identifier for buttons and menu items to reference.
     bl_label = "Change Camera"         # Display name in the interface.
@@ -184,7 +1234,8 @@ class Recon_SwitchCamera(bpy.types.Operator):
         items=[('next', "Next camera", ""),
                ('prev', "Prev caamera", ""),
                ('showcam', "Show caameras", ""),
-               ('refresh', "Refresh", "")
+               ('refresh', "Refresh", ""),
+               ('fullres', "Full size photo", "")
                ],
         name="Direction", 
         default='next',
@@ -192,20 +1243,15 @@ class Recon_SwitchCamera(bpy.types.Operator):
         )
         
     def execute(self, context):        # execute() is called when running the operator.
+        with span('switch_camera.' + self.direction):
+            return self.switch(context)
+
+    def switch(self, context):
         global nav_last_dir
         global nav_loop_filter
 
-        def cam_index(aname):
-            for index, item in enumerate(cams):
-                if aname == item.name:
-                    break
-            else:
-                index = -1
-                
-            return index
-        
         settings = context.scene.recon_settings
-        print('Direction: {:s}'.format(self.direction))
+        debug('Direction: {:s}'.format(self.direction))
 
         scene = context.scene
 
@@ -214,117 +1260,75 @@ class Recon_SwitchCamera(bpy.types.Operator):
                 show_camera(scene, scene.camera, False)
             return {'FINISHED'}
 
-        cams = [obj for obj in scene.objects if obj.type == 'CAMERA']
-        print('Cams total: {:d}'.format(len(cams)))
+        if self.direction == 'fullres':
+            if scene.camera:
+                load_camera_image(scene.camera, full=True)
+            return {'FINISHED'}
+
+        reg = get_cam_registry(scene)
+        debug('Cams total: {:d}'.format(len(reg.cams)))
 
         if self.direction == 'showcam':
-            for item in cams:
+            for item in reg.cams:
                 item.hide_set(False)
             return {'FINISHED'}
 
 
-        # loop filter
-        if not settings.nav_sort_mode in ['none']:
-            print('Last direction {:s}'.format(nav_last_dir))
-            print(nav_loop_filter)
-            if nav_last_dir == self.direction:
-                cams = list(filter(lambda c: not c.name in nav_loop_filter, cams))
-                print('Cams loop filter: {:d}'.format(len(cams)))
-            else:
-                nav_loop_filter = []
-             
-        nav_last_dir = self.direction
-                            
-        # visible filter
-        sel = False
+        sel = None
         if settings.nav_filter_visible:
-            if not sel:
+            with span('navigation.selection'):
                 sel = get_selected_vertices()
-            if sel:
-                cams = list(filter(lambda c: is_visible(sel, c) , cams))
-                # restore sensor for current camera
-                if scene.camera:
-                    adjust_render_resolution(scene.camera)
-                print('Cams selected filter: {:d}'.format(len(cams)))
-
-
-        if scene.camera and 0 <= cam_index(scene.camera.name) < len(cams):
-            nav_loop_filter.append(scene.camera.name)
-
-            # angle filter
-            cam_direction = scene.camera.matrix_world.to_quaternion() @ Vector((0.0, 0.0, -1.0))
-            if settings.nav_filter_angle_enable:            
-                cams = list(filter(lambda c: math.degrees(cam_direction.angle( c.matrix_world.to_quaternion() @ Vector((0.0, 0.0, -1.0)) )) < settings.nav_filter_angle , cams))
-                print('Filter angle: {:d}'.format(len(cams)))
-                print('Cams angle filter: {:d}'.format(len(cams)))
-
-            # distance filter
-            if settings.nav_filter_distance_enable:            
-                cams = list(filter(lambda c: (scene.camera.location - c.location).length < settings.nav_filter_distance , cams))
-                print('Filter distance: {:d}'.format(len(cams)))
-                print('Cams distance filter: {:d}'.format(len(cams)))
-
-            # sort modes
-            if settings.nav_sort_mode == 'distance':                
-                m = scene.camera.matrix_world.inverted()
-                cams.sort(key=lambda c: math.copysign( (c.location - scene.camera.location).length, (m @ c.location).x) )
-                
-            if settings.nav_sort_mode == 'camx':
-                m = scene.camera.matrix_world.inverted()
-                cams.sort(key=lambda c:  (m @ c.location).x )
 
-            if settings.nav_sort_mode == 'camy':
-                m = scene.camera.matrix_world.inverted()
-                cams.sort(key=lambda c:  (m @ c.location).y )
+        if settings.nav_graph:
+            with span('navigation.graph'):
+                cam = nav_graph_step(scene, settings, self.direction, sel)
+            current = scene.camera is not None
+        else:
+            # loop filter
+            skip = ()
+            if not settings.nav_sort_mode in ['none']:
+                debug('Last direction {:s}'.format(nav_last_dir))
+                debug(nav_loop_filter)
+                if nav_last_dir == self.direction:
+                    skip = set(nav_loop_filter)
+                else:
+                    nav_loop_filter = []
 
-            if settings.nav_sort_mode == 'camz':
-                m = scene.camera.matrix_world.inverted()
-                cams.sort(key=lambda c:  (m @ c.location).z )
+            nav_last_dir = self.direction
 
+            found, current = nav_find_cameras(scene, settings, self.direction, sel, skip)
+            if current:
+                nav_loop_filter.append(scene.camera.name)
+            cam = found[0] if found else None
 
-            # find current camera index
-            index = cam_index(scene.camera.name)
-            print('Current camera index: {:d}'.format(index))
-                
-            if index>=0:
-                if self.direction == 'prev':
-                    index -= 1
-                else:
-                    index += 1
-                    if index >= len(cams):
-                        index = -1
-
-            print('Next camera index: {:d}'.format(index))
-            if 0 <= index < len(cams):
-                new_cam_direction = cams[index].matrix_world.to_quaternion() @ Vector((0.0, 0.0, -1.0))
-                print('Angle diff {:f}'.format(math.degrees(cam_direction.angle(new_cam_direction))))
-                print('Distance {:f}'.format( (cams[index].location - scene.camera.location).length ))
-            
-        else:
-            # no camera selected or current camera does not fit filters => jump to first matching cam
-            index = 0
+        if cam:
+            if current:
+                debug('Angle diff {:f}'.format(math.degrees(reg.direction(scene.camera).angle(reg.direction(cam)))))
+                debug('Distance {:f}'.format( (cam.location - scene.camera.location).length ))
 
-                    
-        if 0 <= index < len(cams):
             view_target = False
             if settings.nav_center_selected:
-                if not sel:
+                if sel is None:
                     sel = get_selected_vertices()
-                if sel:
-                    view_target = sum(sel, Vector()) / len(sel)
+                if len(sel):
+                    view_target = Vector(sel.mean(axis=0))
                     #view_target = bpy.context.active_object.matrix_world @ view_target
 
             if settings.nav_hide_other:
-                for obj in scene.objects:
-                    if obj.type == 'CAMERA':
-                        obj.hide_set(True)
+                for obj in reg.cams:
+                    obj.hide_set(True)
             
-            show_camera(scene, cams[index], view_target)
+            with span('show_camera'):
+                show_camera(scene, cam, view_target)
 
-            bg_image = get_bg_image(cams[index])
+            bg_image = get_bg_image(cam)
             if bg_image:
                 bg_image.alpha = settings.nav_alpha
 
+            # photos not loaded on demand are in memory already
+            if settings.nav_prefetch and settings.image_lazy and 'img_path' in cam.data:
+                prefetch_schedule(sel)
+
         return {'FINISHED'}            # Lets Blender know the operator finished successfully.
 
 
@@ -343,6 +1347,11 @@ def update_alpha(self, context):
     
 
 # -----------------------------------------------------------------
+# PhotoScan image orientation code: camera rotation angle
+ORIENTATION_ANGLES = {'3': 180, '6': 90, '8': -90}
+# orientations with swapped image width/height
+ORIENTATION_SWAP = ['6', '8']
+
 def rotate_cam(camera, angle):
     if camera:
         bg = get_bg_image(camera)
@@ -406,19 +1415,11 @@ class Recon_TogglePhoto(bpy.types.Operator):
     def execute(self, context):        # execute() is called when running the operator.
 
         scene = context.scene
-        print(scene.camera.name)
-
-        cams = [obj for obj in scene.objects if obj.type == 'CAMERA']
-        
-        for index, item in enumerate(cams):
-            if scene.camera.name == item.name:
-                break
-        else:
-            index = -1
+        debug(scene.camera.name)
 
-        if index>=0:
-            camera = cams[index]
-            print('Toggle: '+camera.name)
+        camera = get_cam_registry(scene).get(scene.camera.name)
+        if camera:
+            debug('Toggle: '+camera.name)
             camera.data.show_background_images = not camera.data.show_background_images
 
         return {'FINISHED'}            # Lets Blender know the operator finished successfully.
@@ -484,15 +1485,9 @@ class Recon_Orientations(bpy.types.Operator):
         scene = context.scene
         name = bpy.context.scene.transform_orientation_slots[0].type
         print('Switching to '+name);
-        cams = [obj for obj in scene.objects if obj.type == 'CAMERA']
-        for index, item in enumerate(cams):
-            if name == item.name:
-                break
-        else:
-            index = -1
-
-        if index>=0:
-            show_camera(scene, cams[index])
+        cam = get_cam_registry(scene).get(name)
+        if cam:
+            show_camera(scene, cam)
 
         return {'FINISHED'}            # Lets Blender know the operator finished successfully.
 
@@ -506,6 +1501,63 @@ class Recon_Orientations(bpy.types.Operator):
 
 
 
+# -----------------------------------------------------------------
+def read_image_size(f):
+    """(width, height) from PNG or JPEG header of file object, None if unknown.
+    Does not decode image"""
+    head = f.read(24)
+    if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+
+    if head[:2] != b'\xff\xd8':
+        return None
+    f.seek(2)
+    while True:
+        b = f.read(1)
+        while b == b'\xff':
+            b = f.read(1)
+        if not b:
+            return None
+        marker = b[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+        if 0xC0 <= marker <= 0xCF and not marker in [0xC4, 0xC8, 0xCC]:
+            # start of frame: precision, height, width
+            h, w = struct.unpack('>xHH', f.read(5))
+            return (w, h)
+        f.seek(length-2, 1)
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def read_file_image_size(path):
+    with open(path, 'rb') as f:
+        return read_image_size(f)
+
+
+def prefetch_files(paths, workers, read=read_file):
+    """Read files in thread pool. Yields (path, read(path), error) in paths order.
+    Only few files ahead are kept in memory"""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        paths = iter(paths)
+        pending = collections.deque()
+        for path in itertools.islice(paths, workers*2):
+            pending.append((path, pool.submit(read, path)))
+
+        while pending:
+            path, future = pending.popleft()
+            for next_path in itertools.islice(paths, 1):
+                pending.append((next_path, pool.submit(read, next_path)))
+            try:
+                yield path, future.result(), None
+            except Exception as e:
+                yield path, None, e
+
+
 # -----------------------------------------------------------------
 class Recon_ImportImages(bpy.types.Operator):
     bl_idname = "reconstruction.load_image"        # Unique identifier for buttons and menu items to reference.
@@ -517,6 +1569,10 @@ class Recon_ImportImages(bpy.types.Operator):
 
                 
     def execute(self, context):        # execute() is called when running the operator.
+        with span('import_images'):
+            return self.load(context)
+
+    def load(self, context):
         print('Loading...')
 
         settings = bpy.context.scene.recon_settings
@@ -528,24 +1584,47 @@ class Recon_ImportImages(bpy.types.Operator):
                 sel_objs.append(bpy.context.scene.camera)
         else:
             sel_objs = [obj for obj in bpy.context.scene.objects if obj.type == 'CAMERA']
-            
-        for camera in sel_objs:
-            print('Camera {:s} -----------'.format(camera.name))
-            try:
-                img_path = os.path.join(settings.image_path, camera.name+settings.image_ext)
-                print('    Image: {:s}'.format(img_path))
 
-                img = bpy.data.images.load(img_path)
-                img.name = camera.name
-                img.pack()
+        # skip cameras with images we should keep
+        if not settings.image_clean_existing and not settings.image_replace_existing:
+            sel_objs = [camera for camera in sel_objs if not get_bg_image(camera)]
+
+        # read files in background threads, blender data is changed here only
+        # on demand loading only need image size from file header
+        image_path = bpy.path.abspath(settings.image_path)
+        cams = {os.path.join(image_path, camera.name+settings.image_ext): camera for camera in sel_objs}
+        loaded, failed = 0, 0
+        reader = read_file_image_size if settings.image_lazy else read_file
+        for img_path, data, error in prefetch_files(cams.keys(), settings.image_threads, reader):
+            camera = cams[img_path]
+            try:
+                if error:
+                    raise error
+
+                if settings.image_lazy:
+                    img = None
+                    size = data
+                    if not size:
+                        # unknown format, let blender read it
+                        tmp = bpy.data.images.load(img_path, check_existing=False)
+                        size = tuple(tmp.size)
+                        bpy.data.images.remove(tmp)
+                    if settings.image_proxy != '1':
+                        build_image_proxies(img_path, get_proxy_dir(settings))
+                else:
+                    img = bpy.data.images.load(img_path, check_existing=False)
+                    img.name = camera.name
+                    img.pack(data=data, data_len=len(data))
+                    size = read_image_size(io.BytesIO(data)) or tuple(img.size)
 
-                print('    {:d}x{:d}'.format(img.size[0], img.size[1]))
+                debug('Camera {:s}: {:s} {:d}x{:d}'.format(camera.name, img_path, size[0], size[1]))
 
                 bg_angle = 0
                 bg = None
                 if settings.image_clean_existing:
                     for bg_image in camera.data.background_images:
                         if bg_image.image:
+                            photo_cache_drop(bg_image.image.name)
                             bpy.data.images.remove(bg_image.image)
                         camera.data.background_images.remove(bg_image)
                 else:
@@ -554,18 +1633,15 @@ class Recon_ImportImages(bpy.types.Operator):
                 if bg:
                     # image exists
                     bg_angle = bg.rotation
-                    if settings.replace_existing:
-                        print('    Removing old image')
+                    if bg.image:
+                        debug('    Removing old image')
+                        photo_cache_drop(bg.image.name)
                         bpy.data.images.remove(bg.image)
                         bg.image = None
                     
                 if not bg:
                     bg = camera.data.background_images.new()
 
-                if bg.image:
-                    break
-                
-                print('    Attaching new image')
                 bg.show_background_image = True
                 if hasattr(bg, 'view_axis'):
                     # only show the background image when looking through the camera (< 2.8)
@@ -581,19 +1657,235 @@ class Recon_ImportImages(bpy.types.Operator):
                 f = settings.image_f
                 if 'f' in camera.data and not settings.image_replace_f:
                     f = camera.data['f']
-                camera.data.angle = 2*math.atan(max(img.size)/2/f) # img.size[0]
+                camera.data.angle = 2*math.atan(max(size)/2/f) # img.size[0]
                 camera.data['f'] = f
+                camera.data['img_size'] = size
+                if settings.image_lazy:
+                    camera.data['img_path'] = img_path
+                elif 'img_path' in camera.data:
+                    del camera.data['img_path']
 
                 camera.data.show_passepartout = False
                 camera.data.show_background_images = True
-            except:
-                print("    Failed!")
+                loaded += 1
+            except Exception as e:
+                print('Camera {:s}: {:s} failed: {:s}'.format(camera.name, img_path, str(e)))
+                failed += 1
 
+        if settings.image_lazy and bpy.context.scene.camera:
+            load_camera_image(bpy.context.scene.camera)
+
+        # camera frames depend on image size
+        covis_invalidate(settings)
+        count('images_loaded', loaded)
+        count('images_failed', failed)
+
+        if failed:
+            self.report({"WARNING"}, 'Images loaded: {:d}, failed: {:d}. See console for details'.format(loaded, failed))
+        else:
+            self.report({"INFO"}, 'Images loaded: {:d}'.format(loaded))
         print('Done loading.')
         return {'FINISHED'}            # Lets Blender know the operator finished successfully.
 
 
 
+# -----------------------------------------------------------------
+def parse_floats(text):
+    return np.array(text.split(), dtype=np.float64)
+
+
+# PhotoScan camera looks along +Z with Y down, blender camera along -Z with Y up
+PHOTOSCAN_FLIP = np.diag((1.0, -1.0, -1.0, 1.0))
+
+def photoscan_to_world(rotation, translation, transforms):
+    """Convert chunk camera transforms (N,4,4) to blender world matrices (N,4,4) in one pass"""
+    r = np.identity(4)
+    r[:3, :3] = rotation
+    m = r @ transforms
+    m[:, :3, 3] += translation
+    return m @ PHOTOSCAN_FLIP
+
+
+def read_photoscan_cameras(path):
+    """Stream PhotoScan cameras XML and yield one dict per chunk:
+    label, rotation, translation, sensors {id: (width, height, f)}, groups [label],
+    and per camera: labels, group (index or -1), transforms (N,4,4), sensor_ids, orientations.
+    Elements are cleared as soon as they are parsed so memory does not grow with file size"""
+    tags = []
+    chunk = None
+    group = -1
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            tags.append(elem.tag)
+            if elem.tag == 'chunk' and len(tags) == 2:
+                chunk = {
+                    'label': elem.attrib.get('label', ''),
+                    'rotation': np.identity(3),
+                    'translation': np.zeros(3),
+                    'sensors': {},
+                    'groups': [],
+                    'labels': [],
+                    'group': [],
+                    'transforms': [],
+                    'sensor_ids': [],
+                    'orientations': [],
+                    }
+            elif chunk and elem.tag == 'group' and tags[-2] == 'cameras':
+                chunk['groups'].append(elem.attrib['label'])
+                group = len(chunk['groups']) - 1
+            continue
+
+        tags.pop()
+        if not chunk:
+            continue
+        parent = tags[-1]
+
+        if elem.tag == 'sensor' and parent == 'sensors':
+            resolution = elem.find('resolution')
+            chunk['sensors'][elem.attrib['id']] = (
+                float(resolution.attrib['width']),
+                float(resolution.attrib['height']),
+                float(elem.find('calibration').find('f').text),
+                )
+            elem.clear()
+
+        elif elem.tag == 'camera' and parent in ['cameras', 'group']:
+            transform = elem.find('transform')
+            if transform != None:
+                orientation = elem.find('orientation')
+                chunk['labels'].append(elem.attrib['label'])
+                chunk['group'].append(group if parent == 'group' else -1)
+                chunk['transforms'].append(parse_floats(transform.text).reshape((4,4)))
+                chunk['sensor_ids'].append(elem.attrib.get('sensor_id'))
+                chunk['orientations'].append(orientation.text if orientation != None else '')
+            elem.clear()
+
+        elif elem.tag == 'group' and parent == 'cameras':
+            group = -1
+            elem.clear()
+
+        elif elem.tag == 'transform' and parent == 'chunk':
+            chunk['rotation'] = parse_floats(elem.find('rotation').text).reshape((3,3))
+            chunk['translation'] = parse_floats(elem.find('translation').text)
+
+        elif elem.tag == 'chunk' and len(tags) == 1:
+            elem.clear()
+            chunk['group'] = np.array(chunk['group'], dtype=int)
+            chunk['transforms'] = np.array(chunk['transforms']).reshape((-1,4,4))
+            yield chunk
+            chunk = None
+            continue
+
+        if parent == 'chunk':
+            # drop markers, regions etc.
+            elem.clear()
+
+
+# -----------------------------------------------------------------
+# Parsed cameras XML is saved next to it as <xml>.cache.npz and reused
+# while XML file size and modification time are not changed
+CAMERA_CACHE_VERSION = 2
+
+def camera_cache_arrays(k, chunk):
+    prefix = 'c{:d}_'.format(k)
+    sensor_ids = list(chunk['sensors'].keys())
+    return {
+        prefix+'label': chunk['label'],
+        prefix+'rotation': chunk['rotation'],
+        prefix+'translation': chunk['translation'],
+        prefix+'sensor_keys': np.array(sensor_ids, dtype=str),
+        prefix+'sensor_values': np.array([chunk['sensors'][i] for i in sensor_ids]).reshape((-1, 3)),
+        prefix+'groups': np.array(chunk['groups'], dtype=str),
+        prefix+'labels': np.array(chunk['labels'], dtype=str),
+        prefix+'group': chunk['group'],
+        prefix+'transforms': chunk['transforms'],
+        prefix+'sensor_ids': np.array(['' if i is None else i for i in chunk['sensor_ids']], dtype=str),
+        prefix+'orientations': np.array(chunk['orientations'], dtype=str),
+        }
+
+
+def write_npz_arrays(zf, arrays):
+    # same layout as np.savez, one .npy entry per array
+    for name, value in arrays.items():
+        with zf.open(name + '.npy', 'w', force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asanyarray(value), allow_pickle=False)
+
+
+def cache_photoscan_cameras(path, cache_path, stat):
+    """Yield chunks of read_photoscan_cameras() writing each one to cache file as soon as it is parsed"""
+    tmp = cache_path + '.tmp'
+    try:
+        zf = zipfile.ZipFile(tmp, 'w')
+    except OSError as e:
+        print('Can not write cameras cache {:s}: {:s}'.format(cache_path, str(e)))
+        zf = None
+
+    done = False
+    try:
+        k = 0
+        for chunk in read_photoscan_cameras(path):
+            if zf:
+                try:
+                    write_npz_arrays(zf, camera_cache_arrays(k, chunk))
+                except OSError as e:
+                    print('Can not write cameras cache {:s}: {:s}'.format(cache_path, str(e)))
+                    zf.close()
+                    zf = None
+            k += 1
+            yield chunk
+
+        if zf:
+            write_npz_arrays(zf, {'version': CAMERA_CACHE_VERSION, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'chunks': k})
+            zf.close()
+            zf = None
+            os.replace(tmp, cache_path)
+            done = True
+    finally:
+        # import failed or stopped early
+        if zf:
+            zf.close()
+        if not done and os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def read_camera_cache(cache_path):
+    with np.load(cache_path) as data:
+        for k in range(int(data['chunks'])):
+            prefix = 'c{:d}_'.format(k)
+            yield {
+                'label': str(data[prefix+'label']),
+                'rotation': data[prefix+'rotation'],
+                'translation': data[prefix+'translation'],
+                'sensors': {i: tuple(v) for i, v in zip(data[prefix+'sensor_keys'].tolist(), data[prefix+'sensor_values'].tolist())},
+                'groups': data[prefix+'groups'].tolist(),
+                'labels': data[prefix+'labels'].tolist(),
+                'group': data[prefix+'group'],
+                'transforms': data[prefix+'transforms'].reshape((-1, 4, 4)),
+                'sensor_ids': [i if i else None for i in data[prefix+'sensor_ids'].tolist()],
+                'orientations': data[prefix+'orientations'].tolist(),
+                }
+
+
+def load_photoscan_cameras(path, use_cache=True):
+    """Chunks of read_photoscan_cameras() taken from cache file when XML is not changed.
+    Chunks are yielded one by one in both cases"""
+    if not use_cache:
+        return read_photoscan_cameras(path)
+
+    cache_path = path + '.cache.npz'
+    stat = os.stat(path)
+    try:
+        with np.load(cache_path) as data:
+            key = (int(data['version']), int(data['size']), int(data['mtime']))
+        if key == (CAMERA_CACHE_VERSION, stat.st_size, stat.st_mtime_ns):
+            debug('Cameras cache: {:s}'.format(cache_path))
+            return read_camera_cache(cache_path)
+    except Exception as e:
+        debug('Cameras cache not used: {:s}'.format(str(e)))
+
+    return cache_photoscan_cameras(path, cache_path, stat)
+
+
 # -----------------------------------------------------------------
 class Recon_ImportCameras(bpy.types.Operator):
     bl_idname = "reconstruction.load_camera"        # Unique identifier for buttons and menu items to reference.
@@ -603,128 +1895,222 @@ class Recon_ImportCameras(bpy.types.Operator):
     bl_space_type = 'VIEW_3D'
     bl_region_type = 'UI'
 
-                
-    def photoscan2cam(self, world_r, world_t, m_cam):
-        m = world_r.to_4x4() @ m_cam
-        m.translation += world_t
-        return m @ Matrix( ( (1,0,0,0),(0,-1,0,0),(0,0,-1,0),(0,0,0,1) ) )
-
 
     def execute(self, context):        # execute() is called when running the operator.
-        def import_cam(camera, col):
-            name = camera.attrib['label']
-            transform = camera.find('transform')
-            if transform != None:
-                m_cam = Matrix(np.array(transform.text.split(' ')).astype(np.float).reshape((4,4)))
-#                print('Camera {:s}'.format(name))
-#                print(m_cam)
-                
-                cam = False
-                if name in bpy.context.scene.objects.keys():
-                    if settings.cam_update:
-                        cam = bpy.context.scene.objects[name]
-                        if not settings.cam_use_current or cam != bpy.context.scene.camera:
-                            if settings.cam_selected_only and not cam in bpy.context.selected_objects:
-                                cam = False
-                else:
-                    if settings.cam_append:
-                        print('Creating new scene camera')
-                        cam_cam = bpy.data.cameras.new(name)
-                        cam = bpy.data.objects.new(name, cam_cam)
-                        #bpy.context.scene.collection.objects.link(cam)
-                        col.objects.link(cam)
-                        
-                if cam:
-                    print('Setting up scene camera {:s}'.format(name))
-                    cam.matrix_world = self.photoscan2cam(world_r, world_t, m_cam)
-                    
-#                    print(camera.attrib['sensor_id'])
-#                    print(camera.find('orientation').text)
-                    s = sensors[camera.attrib['sensor_id']]
-                    cam.data.lens_unit = 'FOV'
-                    cam.data.angle = 2*math.atan(max(s[0], s[1])/2/s[2])
-                    cam.data['f'] = s[2]
-
-                    cam.data['rotate_hack'] = 0
-                    bg = get_bg_image(cam)
-                    if bg:
-                        bg.rotation = 0
-
-                    orientation = camera.find('orientation')
-                    if orientation != None:
-                        print('Orientation {:s}'.format(orientation.text))
-                        # '1' - original
-                        if orientation.text == '3':
-                            rotate_cam(cam, 180);
-                            cam.data['rotate_hack'] = 0
-
-                        if orientation.text == '6':
-                            rotate_cam(cam, 90);
-                            cam.data['rotate_hack'] = 1
-
-                        if orientation.text == '8':
-                            rotate_cam(cam, -90);
-                            cam.data['rotate_hack'] = 1
-
-                    if cam == bpy.context.scene.camera:
-                        adjust_render_resolution(cam)
-            
-            
+        with span('import_cameras'):
+            return self.load(context)
+
+    def load(self, context):
+        def setup_cam(chunk, i, cam):
+            s = chunk['sensors'][chunk['sensor_ids'][i]]
+            cam.data.lens_unit = 'FOV'
+            cam.data.angle = 2*math.atan(max(s[0], s[1])/2/s[2])
+            cam.data['f'] = s[2]
+
+            cam.data['rotate_hack'] = 0
+            bg = get_bg_image(cam)
+            if bg:
+                bg.rotation = 0
+
+            # '1' - original
+            orientation = chunk['orientations'][i]
+            if orientation in ORIENTATION_ANGLES:
+                rotate_cam(cam, ORIENTATION_ANGLES[orientation]);
+                cam.data['rotate_hack'] = 1 if orientation in ORIENTATION_SWAP else 0
+
+            if cam == scene.camera:
+                adjust_render_resolution(cam)
+
+        def cam_changed(chunk, i, cam, m):
+            """Scene camera differs from imported one more than tolerance"""
+            def differs(a, b):
+                return np.any(np.abs(a - b) > settings.cam_tolerance * np.maximum(1.0, np.abs(b)))
+
+            s = chunk['sensors'][chunk['sensor_ids'][i]]
+            orientation = chunk['orientations'][i]
+            angle = ORIENTATION_ANGLES.get(orientation, 0)
+            bg = get_bg_image(cam)
+            if bg and angle:
+                # rotate_cam() turns camera around its view axis
+                m = m @ np.array(Matrix.Rotation(math.radians(angle), 4, 'Z'))
+
+            if differs(np.array(cam.matrix_world), m):
+                return True
+            if cam.data.lens_unit != 'FOV' or differs(cam.data.angle, 2*math.atan(max(s[0], s[1])/2/s[2])):
+                return True
+            if differs(cam.data.get('f', 0.0), s[2]):
+                return True
+            if cam.data.get('rotate_hack') != (1 if orientation in ORIENTATION_SWAP else 0):
+                return True
+            if bg and differs(bg.rotation, -math.radians(angle)):
+                return True
+            return False
+
+
         print('Loading...')
 
-        settings = context.scene.recon_settings
+        scene = context.scene
+        settings = scene.recon_settings
 
-        sel_cams = [obj for obj in bpy.context.selected_objects if obj.type == 'CAMERA']
+        # build name lookups once instead of per camera
+        objects = {obj.name: obj for obj in scene.objects}
+        selected = {obj.name for obj in context.selected_objects}
         
         try:
             col = bpy.data.collections['Cameras']
         except:
             col = bpy.data.collections.new('Cameras')
-            bpy.context.scene.collection.children.link(col)
-
-        tree = ET.parse(bpy.path.abspath(settings.cam_file))            
-        chunks = tree.findall('chunk')
-        for chunk in chunks:
-            print('Chunk {:s}'.format(chunk.attrib['label']))
-            transform = chunk.find('transform')
-            world_t = Vector(np.array(transform.find('translation').text.split(' ')).astype(np.float))
-            print(world_t)
-            world_r = Matrix(np.array(transform.find('rotation').text.split(' ')).astype(np.float).reshape((3,3)))
-            print(world_r)
-            
-            s = chunk.find('sensors').findall('sensor')
-            sensors={}
-            for sensor in s:
-                resolution = sensor.find('resolution') 
-#                print(sensor.find('calibration').attrib['type'])
-                sensors[sensor.attrib['id']] = (
-                    float(resolution.attrib['width']),
-                    float(resolution.attrib['height']),
-                    float(sensor.find('calibration').find('f').text),
-                    )
-            print(sensors)
-
-            cameras = chunk.find('cameras')
-            for group in cameras.findall('group'):
+            scene.collection.children.link(col)
+
+        added, updated, unchanged = 0, 0, 0
+        for chunk in load_photoscan_cameras(bpy.path.abspath(settings.cam_file), settings.cam_cache):
+            debug('Chunk {:s}'.format(chunk['label']))
+            debug(chunk['translation'])
+            debug(chunk['rotation'])
+            debug(chunk['sensors'])
+            world = photoscan_to_world(chunk['rotation'], chunk['translation'], chunk['transforms'])
+
+            grpcols = []
+            for label in chunk['groups']:
                 try:
-                    grpcol = col.children[group.attrib['label']]
+                    grpcol = col.children[label]
                 except:
-                    grpcol = bpy.data.collections.new(group.attrib['label'])
+                    grpcol = bpy.data.collections.new(label)
                     col.children.link(grpcol)
-                    
-                for camera in group.findall('camera'):
-                    import_cam(camera, grpcol)
-
-
-            for camera in cameras.findall('camera'):
-                import_cam(camera, col)
-
-
+                grpcols.append(grpcol)
+
+            # grouped cameras first, then ungrouped ones
+            group = chunk['group']
+            order = np.argsort(np.where(group < 0, len(grpcols), group), kind='stable')
+
+            # find cameras to update and cameras to create
+            targets = {}
+            missing = {}
+            for i in order:
+                name = chunk['labels'][i]
+                if name in missing:
+                    # duplicate label, same as updating just created camera
+                    if settings.cam_update and not settings.cam_selected_only:
+                        missing[name] = (i, missing[name][1])
+                elif name in objects:
+                    if settings.cam_update:
+                        cam = objects[name]
+                        if ( (settings.cam_use_current and cam == scene.camera)
+                                or not settings.cam_selected_only or name in selected ):
+                            targets[name] = (i, cam)
+                elif settings.cam_append:
+                    missing[name] = (i, grpcols[group[i]] if group[i] >= 0 else col)
+
+            # do not touch existing cameras which are already in place
+            # so depsgraph and undo only get real changes
+            if settings.cam_changed_only:
+                same = [name for name, (i, cam) in targets.items() if not cam_changed(chunk, i, cam, world[i])]
+                for name in same:
+                    del targets[name]
+                unchanged += len(same)
+            updated += len(targets)
+
+            # create all new cameras in one go
+            if missing:
+                debug('Creating {:d} new scene cameras'.format(len(missing)))
+                count('cameras_created', len(missing))
+                cam_data = [bpy.data.cameras.new(name) for name in missing]
+                new_cams = [bpy.data.objects.new(name, data) for name, data in zip(missing, cam_data)]
+                for (name, (i, cam_col)), cam in zip(missing.items(), new_cams):
+                    cam_col.objects.link(cam)
+                    objects[name] = cam
+                    targets[name] = (i, cam)
+                added += len(missing)
+
+            debug('Setting up {:d} scene cameras'.format(len(targets)))
+            count('cameras_set_up', len(targets))
+            for i, cam in targets.values():
+                cam.matrix_world = Matrix(world[i])
+
+            for i, cam in targets.values():
+                setup_cam(chunk, i, cam)
+
+        if added or updated:
+            cam_registry_invalidate()
+            covis_invalidate(settings)
+
+        count('cameras_unchanged', unchanged)
+        msg = 'Cameras added: {:d}, updated: {:d}, unchanged: {:d}'.format(added, updated, unchanged)
+        print(msg)
+        self.report({"INFO"}, msg)
         print('Done loading.')
         return {'FINISHED'}            # Lets Blender know the operator finished successfully.
 
 
 
+# -----------------------------------------------------------------
+def read_markers(path):
+    """Marker labels and positions from .csv or .npy exported by marker_positions.py"""
+    if path.lower().endswith('.npy'):
+        markers = np.load(path, mmap_mode='r')
+        labels = np.char.decode(markers['label'], 'utf-8', 'ignore')
+        chunks = np.unique(markers['chunk'])
+        if len(chunks) > 1:
+            # same labels can be used in different chunks
+            labels = np.char.add(np.char.add(np.char.decode(markers['chunk'], 'utf-8', 'ignore'), '/'), labels)
+        return labels, np.asarray(markers['pos'], dtype=np.float64).reshape((-1, 3))
+
+    # csv module keeps quoted labels with commas, numbers are converted in one go
+    with open(path, newline='') as csvfile:
+        rows = [row[0:4] for row in csv.reader(csvfile) if row]
+    if not rows:
+        return np.array([], dtype=str), np.empty((0, 3))
+    labels = np.array([row[0] for row in rows], dtype=str)
+    return labels, np.array([row[1:4] for row in rows], dtype=str).astype(np.float64).reshape((-1, 3))
+
+
+def get_marker_labels(mp, mesh):
+    """Vertex index by marker label from MeasureIt label segments.
+    None if segments do not map one to one to mesh vertices"""
+    segments = mp.measureit_segments
+    points = np.empty(len(segments), dtype=np.int32)
+    segments.foreach_get('glpointa', points)
+    labels = {seg.gltxt: int(p) for seg, p in zip(segments, points)}
+    if len(labels) != len(mesh.vertices) or len(segments) != len(mesh.vertices):
+        return None
+    if not np.array_equal(np.sort(points), np.arange(len(points))):
+        return None
+    return labels
+
+
+def add_marker_segments(scene, mp, labels, index):
+    """Append MeasureIt label segments for vertices index"""
+    segments = mp.measureit_segments
+    first = len(segments)
+    for i in range(len(labels)):
+        segments.add()
+    n = len(segments)
+
+    def fill(attr, value, dtype, size=1):
+        values = np.empty(n*size, dtype=dtype)
+        segments.foreach_get(attr, values)
+        values.reshape((n, size))[first:] = np.reshape(value, (-1, size))
+        segments.foreach_set(attr, values)
+
+    # numeric properties in bulk
+    fill('gltype', 2, np.int32)
+    fill('glpointa', index, np.int32)
+    fill('glpointb', index, np.int32)
+    fill('glarrow_s', scene.measureit_glarrow_s, np.int32)
+    fill('glcolor', scene.measureit_default_color, np.float32, 4)
+    fill('glspace', scene.measureit_hint_space, np.float32)
+    fill('glfont_size', scene.measureit_font_size, np.int32)
+    fill('glfont_rotat', scene.measureit_font_rotation, np.int32)
+
+    # strings and enums can not be set with foreach_set
+    for ms, label in zip(segments[first:], labels):
+        ms.glarrow_a = scene.measureit_glarrow_a
+        ms.glarrow_b = scene.measureit_glarrow_b
+        ms.gltxt = label
+        ms.glfont_align = scene.measureit_font_align
+    mp.measureit_num = n
+
+
 # -----------------------------------------------------------------
 class Recon_ImportMarkers(bpy.types.Operator):
     bl_idname = "reconstruction.load_markers"        # Unique identifier for buttons and menu items to reference.
@@ -734,14 +2120,12 @@ class Recon_ImportMarkers(bpy.types.Operator):
     bl_space_type = 'VIEW_3D'
     bl_region_type = 'UI'
 
-                
-    def photoscan2cam(self, world_r, world_t, m_cam):
-        m = world_r.to_4x4() @ m_cam
-        m.translation += world_t
-        return m @ Matrix( ( (1,0,0,0),(0,-1,0,0),(0,0,-1,0),(0,0,0,1) ) )
-
 
     def execute(self, context):        # execute() is called when running the operator.
+        with span('import_markers'):
+            return self.load(context)
+
+    def load(self, context):
         print('Loading...')
 
         scene = context.scene
@@ -755,10 +2139,6 @@ class Recon_ImportMarkers(bpy.types.Operator):
             obj  = bpy.data.objects.new("Markers", mesh)
             bpy.context.collection.objects.link(obj)
             
-        bm = bmesh.new()
-        bm.from_mesh(obj.data)
-        bm.clear()
-
         # from measureit\measureit_main.py
         if 'MeasureGenerator' not in obj:
             obj.MeasureGenerator.add()
@@ -789,44 +2169,52 @@ class Recon_ImportMarkers(bpy.types.Operator):
         """
         
         # load python exported markers 'marker.position' .CSV
-        with open( bpy.path.abspath(settings.markers_file) ) as csvfile:
-            rdr = csv.reader( csvfile )
-            for i, row in enumerate( rdr ):
-                name, x,y,z = row[0:4]
-                co = Vector([float(x), float(y), float(z)])
-                print("Marker {:s}: {:s}".format(name, str(co) ))
-                
-                id = len(bm.verts)
-                v = bm.verts.new(co)
-
-                mp.measureit_segments.add()
-                ms = mp.measureit_segments[mp.measureit_num]
-                ms.gltype = 2
-                ms.glpointa = id
-                ms.glpointb = id
-                ms.glarrow_a = scene.measureit_glarrow_a
-                ms.glarrow_b = scene.measureit_glarrow_b
-                ms.glarrow_s = scene.measureit_glarrow_s
-                # color
-                ms.glcolor = scene.measureit_default_color
-                # dist
-                ms.glspace = scene.measureit_hint_space
-                # text
-                ms.gltxt = name
-                ms.glfont_size = scene.measureit_font_size
-                ms.glfont_align = scene.measureit_font_align
-                ms.glfont_rotat = scene.measureit_font_rotation
-                # Add index
-                mp.measureit_num += 1
-
-                
-                
-        bm.to_mesh(obj.data)
-        bm.free()
-
-        #for v in obj        
-        
-        context.area.tag_redraw()
+        labels, co = read_markers(bpy.path.abspath(settings.markers_file))
+        # last position wins for duplicated labels
+        keep = np.array(sorted({label: i for i, label in enumerate(labels)}.values()), dtype=int)
+        labels, co = labels[keep], co[keep]
+        debug('Markers in file: {:d}'.format(len(labels)))
+
+        existing = get_marker_labels(mp, mesh)
+        if existing is None or (settings.markers_replace and len(existing.keys() - set(labels))):
+            # removing vertices would renumber segments, rebuild everything
+            removed = len(mesh.vertices)
+            name = mesh.name
+            obj.data = bpy.data.meshes.new(name)
+            if not mesh.users:
+                bpy.data.meshes.remove(mesh)
+                # new mesh got numbered name while old one existed
+                obj.data.name = name
+            mesh = obj.data
+            mp.measureit_segments.clear()
+            mp.measureit_num = 0
+            index = np.full(len(labels), -1)
+        else:
+            removed = 0
+            index = np.array([existing.get(label, -1) for label in labels], dtype=int)
+
+        # move existing markers in place
+        verts = mesh.vertices
+        old = index >= 0
+        new = ~old
+        all_co = np.empty((len(verts) + new.sum(), 3), dtype=np.float32)
+        verts.foreach_get('co', all_co[:len(verts)].ravel())
+        all_co[index[old]] = co[old]
+        all_co[len(verts):] = co[new]
+        first = len(verts)
+        verts.add(int(new.sum()))
+        verts.foreach_set('co', all_co.ravel())
+        mesh.update()
+
+        add_marker_segments(scene, mp, labels[new], np.arange(first, len(verts)))
+        count('markers', len(labels))
+
+        msg = 'Markers added: {:d}, updated: {:d}, removed: {:d}'.format(int(new.sum()), int(old.sum()), removed)
+        print(msg)
+        self.report({"INFO"}, msg)
+
+        if context.area:
+            context.area.tag_redraw()
 
         print('Done loading.')
         return {'FINISHED'}            # Lets Blender know the operator finished successfully.
@@ -845,6 +2233,7 @@ class Recon_ImportMarkers_panel(bpy.types.Panel):
 
         settings = context.scene.recon_settings
         layout.prop(settings, "markers_file")
+        layout.prop(settings, "markers_replace")
 
         layout.separator()
 
@@ -852,6 +2241,334 @@ class Recon_ImportMarkers_panel(bpy.types.Panel):
 
 
 
+# -----------------------------------------------------------------
+# Quick export writers. Evaluated meshes are read directly so selection,
+# visibility and mode are not touched. Coordinates are written in world space
+# with Z up, Y forward as blender uses
+EXPORT_TYPES = ['MESH', 'CURVE', 'SURFACE', 'FONT', 'META']
+
+# rows formatted per write() call
+EXPORT_BLOCK = 1 << 16
+
+OBJ_HEADER = b'# Photo Reconstruction Tools quick export\n'
+
+def get_export_arrays(obj, depsgraph):
+    """World space vertices, vertex normals, triangles and loose edges of evaluated object"""
+    eval_obj = obj.evaluated_get(depsgraph)
+    mesh = eval_obj.to_mesh()
+    try:
+        verts = mesh.vertices
+        co = np.empty(len(verts)*3, dtype=np.float32)
+        verts.foreach_get('co', co)
+        normals = np.empty(len(verts)*3, dtype=np.float32)
+        verts.foreach_get('normal', normals)
+
+        mesh.calc_loop_triangles()
+        tris = np.empty(len(mesh.loop_triangles)*3, dtype=np.int32)
+        mesh.loop_triangles.foreach_get('vertices', tris)
+
+        edges = np.empty(len(mesh.edges)*2, dtype=np.int32)
+        mesh.edges.foreach_get('vertices', edges)
+        loose = np.empty(len(mesh.edges), dtype=bool)
+        mesh.edges.foreach_get('is_loose', loose)
+    finally:
+        eval_obj.to_mesh_clear()
+
+    m = np.array(eval_obj.matrix_world)
+    co = co.reshape((-1, 3)) @ m[:3, :3].T + m[:3, 3]
+    # normals are transformed by inverse transpose
+    normals = normals.reshape((-1, 3)) @ np.linalg.inv(m[:3, :3])
+    length = np.linalg.norm(normals, axis=1)
+    normals /= np.where(length > 0, length, 1.0)[:, None]
+    tris = tris.reshape((-1, 3))
+    if np.linalg.det(m[:3, :3]) < 0:
+        # mirrored object, keep faces pointing outside
+        tris = np.ascontiguousarray(tris[:, ::-1])
+    return co, normals, tris, edges.reshape((-1, 2))[loose]
+
+
+def write_rows(f, fmt, rows):
+    for i in range(0, len(rows), EXPORT_BLOCK):
+        block = rows[i:i+EXPORT_BLOCK]
+        f.write(((fmt * len(block)) % tuple(block.ravel().tolist())).encode('utf-8'))
+
+
+def write_obj_part(f, name, co, normals, tris, edges, offset=1):
+    """OBJ object with vertex normals, triangles and loose edges to binary file, offset: index of first vertex"""
+    f.write('o {:s}\n'.format(name).encode('utf-8'))
+    write_rows(f, 'v %.6f %.6f %.6f\n', co)
+    write_rows(f, 'vn %.4f %.4f %.4f\n', normals)
+    # vertex and normal indices are the same
+    write_rows(f, 'f %d//%d %d//%d %d//%d\n', np.repeat(tris + offset, 2, axis=1))
+    write_rows(f, 'l %d %d\n', edges + offset)
+
+
+def write_ply(path, parts):
+    """Binary little endian PLY of all parts merged"""
+    co = np.concatenate([p[1] for p in parts]) if parts else np.empty((0, 3))
+    offsets = np.cumsum([0] + [len(p[1]) for p in parts])
+
+    verts = np.empty(len(co), dtype=[('co', '<f4', 3), ('normal', '<f4', 3)])
+    verts['co'] = co
+    verts['normal'] = np.concatenate([p[2] for p in parts]) if parts else co
+
+    tris = [p[3] + o for p, o in zip(parts, offsets)]
+    tris = np.concatenate(tris) if tris else np.empty((0, 3), dtype=np.int32)
+    faces = np.empty(len(tris), dtype=[('count', 'u1'), ('vertices', '<i4', 3)])
+    faces['count'] = 3
+    faces['vertices'] = tris
+
+    edges = [p[4] + o for p, o in zip(parts, offsets)]
+    edges = np.concatenate(edges).astype('<i4') if edges else np.empty((0, 2), dtype='<i4')
+
+    header = '\n'.join([
+        'ply',
+        'format binary_little_endian 1.0',
+        'comment Photo Reconstruction Tools quick export',
+        'element vertex {:d}'.format(len(verts)),
+        'property float x', 'property float y', 'property float z',
+        'property float nx', 'property float ny', 'property float nz',
+        'element face {:d}'.format(len(faces)),
+        'property list uchar int vertex_indices',
+        'element edge {:d}'.format(len(edges)),
+        'property int vertex1', 'property int vertex2',
+        'end_header',
+        ''])
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        verts.tofile(f)
+        faces.tofile(f)
+        edges.tofile(f)
+
+
+# -----------------------------------------------------------------
+# Quick export cache. Extracted arrays and formatted OBJ text of each object are
+# kept in <export file>.parts/ with a manifest of content fingerprints, so
+# unchanged objects are only copied into the merged file
+EXPORT_CACHE_VERSION = 2
+
+def get_buffer(coll, attr, width, dtype):
+    data = np.empty(len(coll)*width, dtype=dtype)
+    coll.foreach_get(attr, data)
+    return data
+
+
+def export_fingerprint(obj, depsgraph):
+    """sha1 of evaluated mesh buffers and world matrix, None for non mesh objects.
+    Evaluated mesh covers modifiers, their target objects, vertex weights, armature pose and shape keys"""
+    if obj.type != 'MESH':
+        return None
+    eval_obj = obj.evaluated_get(depsgraph)
+    mesh = eval_obj.data
+    h = hashlib.sha1()
+    h.update(get_buffer(mesh.vertices, 'co', 3, np.float32).tobytes())
+    h.update(get_buffer(mesh.edges, 'vertices', 2, np.int32).tobytes())
+    h.update(get_buffer(mesh.polygons, 'loop_total', 1, np.int32).tobytes())
+    h.update(get_buffer(mesh.loops, 'vertex_index', 1, np.int32).tobytes())
+    h.update(np.array(eval_obj.matrix_world, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def read_export_manifest(parts_dir, name='manifest.json'):
+    try:
+        with open(os.path.join(parts_dir, name)) as f:
+            manifest = json.load(f)
+        if manifest['version'] == EXPORT_CACHE_VERSION:
+            return manifest['parts']
+    except (OSError, ValueError, KeyError) as e:
+        debug('Export cache not used: {:s}'.format(str(e)))
+    return {}
+
+
+def write_export_manifest(parts_dir, parts, name='manifest.json'):
+    tmp = os.path.join(parts_dir, name+'.tmp')
+    with open(tmp, 'w') as f:
+        json.dump({'version': EXPORT_CACHE_VERSION, 'parts': parts}, f, indent=1)
+    os.replace(tmp, os.path.join(parts_dir, name))
+
+
+def load_export_part(parts_dir, entry):
+    with np.load(os.path.join(parts_dir, entry['key']+'.npz')) as data:
+        return data['co'], data['normals'], data['tris'], data['edges']
+
+
+def export_objects(path, objects, depsgraph, use_cache=True):
+    """Write objects to merged .obj or .ply file reusing cached parts of unchanged objects.
+    Returns number of objects extracted again"""
+    ply = path.lower().endswith('.ply')
+    parts_dir = path + '.parts'
+    manifest = {}
+    if use_cache:
+        manifest = read_export_manifest(parts_dir)
+        os.makedirs(parts_dir, exist_ok=True)
+
+    # [(name, manifest entry, arrays or None if cached)]
+    parts = []
+    changed = 0
+    for obj in objects:
+        fingerprint = export_fingerprint(obj, depsgraph) if use_cache else None
+        entry = manifest.get(obj.name)
+        if fingerprint and entry and entry['fingerprint'] == fingerprint \
+                and os.path.exists(os.path.join(parts_dir, entry['key']+'.npz')):
+            parts.append((obj.name, entry, None))
+            continue
+
+        arrays = get_export_arrays(obj, depsgraph)
+        changed += 1
+        entry = {'fingerprint': fingerprint, 'key': hashlib.sha1(obj.name.encode('utf-8')).hexdigest()[:16],
+                 'verts': len(arrays[0])}
+        if fingerprint:
+            with open(os.path.join(parts_dir, entry['key']+'.npz'), 'wb') as f:
+                np.savez(f, co=arrays[0], normals=arrays[1], tris=arrays[2], edges=arrays[3])
+        parts.append((obj.name, entry, arrays))
+
+    if ply:
+        write_ply(path, [(name,) + (load_export_part(parts_dir, entry) if arrays is None else arrays)
+                         for name, entry, arrays in parts])
+    else:
+        with open(path, 'wb', buffering=1 << 20) as f:
+            f.write(OBJ_HEADER)
+            offset = 1
+            for name, entry, arrays in parts:
+                if not entry['fingerprint']:
+                    write_obj_part(f, name, *arrays, offset=offset)
+                else:
+                    # cached text is valid while object starts at the same vertex index
+                    chunk = os.path.join(parts_dir, entry['key']+'.obj')
+                    if arrays is not None or entry.get('offset') != offset or not os.path.exists(chunk):
+                        if arrays is None:
+                            arrays = load_export_part(parts_dir, entry)
+                        with open(chunk, 'wb', buffering=1 << 20) as part_f:
+                            write_obj_part(part_f, name, *arrays, offset=offset)
+                        entry['offset'] = offset
+                    with open(chunk, 'rb') as part_f:
+                        shutil.copyfileobj(part_f, f, 1 << 20)
+                offset += entry['verts']
+
+    if use_cache:
+        # remove parts of objects not exported anymore
+        keys = set(entry['key'] for name, entry, arrays in parts)
+        for entry in manifest.values():
+            if not entry['key'] in keys:
+                for ext in ('.npz', '.obj'):
+                    try:
+                        os.remove(os.path.join(parts_dir, entry['key']+ext))
+                    except OSError:
+                        pass
+        write_export_manifest(parts_dir, {name: entry for name, entry, arrays in parts if entry['fingerprint']})
+    return changed
+
+
+# -----------------------------------------------------------------
+# One file per object export. Arrays are extracted on main thread and
+# formatted by worker threads, or optionally by forked worker processes
+# reading them from shared memory
+OBJECTS_MANIFEST = 'objects.json'
+
+def write_part_file(path, name, arrays):
+    if path.lower().endswith('.ply'):
+        write_ply(path, [(name,) + tuple(arrays)])
+    else:
+        with open(path, 'wb', buffering=1 << 20) as f:
+            f.write(OBJ_HEADER)
+            write_obj_part(f, name, *arrays)
+    return path
+
+
+def share_arrays(arrays):
+    """Copy arrays to new shared memory block, returns block and layout [(dtype, shape)]"""
+    layout = [(a.dtype.str, a.shape) for a in arrays]
+    shm = shared_memory.SharedMemory(create=True, size=max(1, sum(a.nbytes for a in arrays)))
+    pos = 0
+    for a in arrays:
+        np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf, offset=pos)[...] = a
+        pos += a.nbytes
+    return shm, layout
+
+
+def shared_arrays(shm, layout):
+    arrays = []
+    pos = 0
+    for dtype, shape in layout:
+        arrays.append(np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=pos))
+        pos += arrays[-1].nbytes
+    return arrays
+
+
+def write_shared_part_file(path, name, shm_name, layout):
+    """Worker process side of write_part_file()"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        # views into block are released before close
+        return write_part_file(path, name, shared_arrays(shm, layout))
+    finally:
+        shm.close()
+
+
+def export_objects_separately(path, objects, depsgraph, use_cache=True, workers=None, processes=False):
+    """Write each object to '<object name>.obj' or .ply next to path.
+    Returns number of objects extracted again"""
+    folder = os.path.dirname(path)
+    ext = os.path.splitext(path)[1] or '.obj'
+    files = [os.path.join(folder, bpy.path.clean_name(obj.name) + ext) for obj in objects]
+    same = sorted(name for name, n in collections.Counter(files).items() if n > 1)
+    if same:
+        raise ValueError('Several objects export to same file: {:s}'.format(', '.join(os.path.basename(f) for f in same)))
+
+    parts_dir = path + '.parts'
+    manifest = {}
+    if use_cache:
+        manifest = read_export_manifest(parts_dir, OBJECTS_MANIFEST)
+        os.makedirs(parts_dir, exist_ok=True)
+
+    # processes need fork to run addon code without importing it again. Forking
+    # blender with its own threads running is not safe in general, so it is opt-in
+    use_processes = processes and shared_memory is not None and 'fork' in multiprocessing.get_all_start_methods()
+    if use_processes:
+        # workers share tracker of shared memory blocks with this process instead of starting own ones
+        resource_tracker.ensure_running()
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+        # fork pool starts all workers on first submit, do it before bpy data is touched
+        pool.submit(int).result()
+    else:
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    debug('Export pool: {:s}'.format('processes' if use_processes else 'threads'))
+
+    new_manifest = {}
+    blocks = []
+    futures = []
+    try:
+        # extraction needs bpy so stays here while workers format previous objects
+        for obj, file_path in zip(objects, files):
+            fingerprint = export_fingerprint(obj, depsgraph) if use_cache else None
+            entry = manifest.get(obj.name)
+            if fingerprint and entry and entry['fingerprint'] == fingerprint and os.path.exists(file_path):
+                new_manifest[obj.name] = entry
+                continue
+
+            arrays = get_export_arrays(obj, depsgraph)
+            if use_processes:
+                shm, layout = share_arrays(arrays)
+                blocks.append(shm)
+                futures.append(pool.submit(write_shared_part_file, file_path, obj.name, shm.name, layout))
+            else:
+                futures.append(pool.submit(write_part_file, file_path, obj.name, arrays))
+            if fingerprint:
+                new_manifest[obj.name] = {'fingerprint': fingerprint}
+
+        for future in futures:
+            debug('Exported: {:s}'.format(future.result()))
+    finally:
+        pool.shutdown()
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    if use_cache:
+        write_export_manifest(parts_dir, new_manifest, OBJECTS_MANIFEST)
+    return len(futures)
+
+
 # -----------------------------------------------------------------
 #class Recon_ExportList_item(PropertyGroup):
 #    idx: IntProperty()
@@ -904,75 +2621,28 @@ class Recon_Export(bpy.types.Operator):
 
 
     def do_export(self, context):
-        global export_list_idx
         settings = context.scene.recon_settings
-        list = settings.export_objects
-        
-        # Save selection
-        obj_active = bpy.context.view_layer.objects.active
-        selection = bpy.context.selected_objects
-        mode = obj_active.mode
-
-        bpy.ops.object.mode_set(mode='OBJECT')
-        bpy.ops.object.select_all(action='DESELECT')
-
-        hidden = []
-        for itm in list:
-            obj = context.scene.objects.get(itm.name, None)
-            if obj:
-                if obj.hide_get():
-                    hidden.append(obj.name)
-                    obj.hide_set(False)
-                obj.select_set(True)
-#            print(itm.name)
+        path = bpy.path.abspath(settings.export_file)
+
+        objects = [context.scene.objects.get(itm.name, None) for itm in settings.export_objects]
+        objects = [obj for obj in objects if obj and obj.type in EXPORT_TYPES]
+        # flush edit mode changes without leaving edit mode
+        for obj in objects:
+            if obj.mode == 'EDIT':
+                obj.update_from_editmode()
+        depsgraph = context.evaluated_depsgraph_get()
         try:
-            bpy.ops.export_scene.obj(
-                filepath = bpy.path.abspath(settings.export_file),
-                check_existing = True,
-                filter_glob="*.obj;*.mtl", 
-                use_selection=True, 
-                use_animation=False, 
-                use_mesh_modifiers=True, 
-                use_edges=True, 
-                use_smooth_groups=False, 
-                use_smooth_groups_bitflags=False, 
-                use_normals=True, 
-                use_uvs=False, 
-                use_materials=False, 
-                use_triangles=True, 
-                use_nurbs=False, 
-                use_vertex_groups=False, 
-                use_blen_objects=True, 
-                group_by_object=False, 
-                group_by_material=False, 
-                keep_vertex_order=False, 
-                global_scale=1.0, 
-                path_mode='AUTO', 
-                axis_forward='Y', 
-                axis_up='Z'
-                )
-
-            self.report({"INFO"}, 'Export done: {:s}'.format(settings.export_file) )
+            with span('export'):
+                if settings.export_per_object:
+                    changed = export_objects_separately(path, objects, depsgraph, settings.export_cache,
+                                                        settings.export_workers, settings.export_processes)
+                else:
+                    changed = export_objects(path, objects, depsgraph, settings.export_cache)
+            count('exported_objects', changed)
+            self.report({"INFO"}, 'Export done: {:s}, {:d} of {:d} objects changed'.format(settings.export_file, changed, len(objects)) )
         except Exception as e:
-            if hasattr(e, 'message'):
-                self.report({"ERROR"}, e.message)
-            else:
-                self.report({"ERROR"}, str(e) )
-
-        # restore hidden
-        for name in hidden:
-            obj = context.scene.objects.get(name, None)
-            if obj:
-                obj.hide_set(True)
-            
-        # Restore selection
-        bpy.ops.object.select_all(action='DESELECT')
-        for obj in selection:
-            obj.select_set(True)
-        bpy.context.view_layer.objects.active = obj_active
-        if not obj_active.hide_get():
-            bpy.ops.object.mode_set(mode=mode)
-
+            count('export_failed')
+            self.report({"ERROR"}, str(e) )
 
 
     def execute(self, context):        # execute() is called when running the operator.
@@ -1003,6 +2673,12 @@ class Recon_Export_panel(bpy.types.Panel):
 
         settings = context.scene.recon_settings
         layout.prop(settings, "export_file")
+        layout.prop(settings, "export_cache")
+        row = layout.row()
+        row.prop(settings, "export_per_object")
+        if settings.export_per_object:
+            row.prop(settings, "export_workers")
+            row.prop(settings, "export_processes")
 
         layout.separator()
 
@@ -1017,6 +2693,30 @@ class Recon_Export_panel(bpy.types.Panel):
 
 
 
+# -----------------------------------------------------------------
+def get_orientation_matrix(context):
+    """Custom transform orientation or orientation of active object edit mode selection"""
+    slot = context.scene.transform_orientation_slots[0]
+    if slot.custom_orientation:
+        return slot.custom_orientation.matrix.to_4x4()
+
+    # temporary orientation is made from edit mode selection
+    obj = context.active_object
+    if not obj:
+        return None
+    mode = obj.mode
+    if mode != 'EDIT':
+        bpy.ops.object.mode_set(mode='EDIT')
+    or_save = slot.type
+    bpy.ops.transform.create_orientation(name = 'set_orientation_temporary', use_view=False, use=True, overwrite = True)
+    mat = slot.custom_orientation.matrix.to_4x4()
+    bpy.ops.transform.delete_orientation()
+    slot.type = or_save
+    if mode != 'EDIT':
+        bpy.ops.object.mode_set(mode=mode)
+    return mat
+
+
 # -----------------------------------------------------------------
 class Recon_Tools(bpy.types.Operator):
     bl_idname = "reconstruction.tools"
@@ -1030,6 +2730,7 @@ class Recon_Tools(bpy.types.Operator):
     cmd: bpy.props.EnumProperty(
         items=[ ('set_orientation', "Set object orientation", ""),
                 ('measure_edge', 'Measure active edge len', ''),
+                ('build_covis', 'Build covisibility index', ''),
                ],
         name="Command", 
         default='set_orientation',
@@ -1037,41 +2738,54 @@ class Recon_Tools(bpy.types.Operator):
         )
 
     def do_set_orientation(self, context):
-        obj = bpy.context.active_object
-        if not obj or obj.type != 'MESH':
+        active = bpy.context.active_object
+        objs = [obj for obj in bpy.context.selected_objects if obj.type == 'MESH']
+        if active and active.type == 'MESH' and not active in objs:
+            objs.append(active)
+        if not objs:
             return
-        old_mat = obj.matrix_world
 
-        mode = obj.mode
-        bpy.ops.object.mode_set(mode='EDIT')
+        orientation = get_orientation_matrix(context)
+        if orientation is None:
+            self.report({"ERROR"}, 'Please select transform orientation or active object')
+            return
 
-        try:
-            new_mat = bpy.context.scene.transform_orientation_slots[0].custom_orientation.matrix.to_4x4()
-        except:
-            or_save = bpy.context.scene.transform_orientation_slots[0].type
-            bpy.ops.transform.create_orientation(name = 'set_orientation_temporary', use_view=False, use=True, overwrite = True)
-            new_mat = bpy.context.scene.transform_orientation_slots[0].custom_orientation.matrix.to_4x4()
-            bpy.ops.transform.delete_orientation()
-            bpy.context.scene.transform_orientation_slots[0].type = or_save
-        
-        # keep object translation
-        new_mat = Matrix.Translation(old_mat.to_translation()) @ new_mat
-        k = new_mat.inverted() @ old_mat
-
-        bpy.ops.object.mode_set(mode='OBJECT')
-
-        bm = bmesh.new()
-        bm.from_mesh(obj.data)
-        for v in bm.verts:
-            new_co = k @ v.co.to_4d()
-            v.co = new_co.to_3d()
-        bm.to_mesh(obj.data)
-        bm.free()
-            
-        bpy.ops.object.mode_set(mode=mode)
+        # objects sharing mesh get one transform, which suits all of them only
+        # if they have same rotation and scale and no other object uses that mesh
+        groups = collections.OrderedDict()
+        for obj in objs:
+            groups.setdefault(obj.data, []).append(obj)
+        skipped = 0
+        for mesh, group in list(groups.items()):
+            basis = np.array(group[0].matrix_world)[:3, :3]
+            if mesh.users > len(group) or not all(np.allclose(np.array(obj.matrix_world)[:3, :3], basis, rtol=1e-6, atol=1e-9) for obj in group[1:]):
+                del groups[mesh]
+                skipped += len(group)
+
+        with span('set_orientation'):
+            for mesh, group in groups.items():
+                obj = group[0]
+                old_mat = obj.matrix_world.copy()
+                # keep object translation
+                new_mat = Matrix.Translation(old_mat.to_translation()) @ orientation
+                k = new_mat.inverted() @ old_mat
+
+                if obj.mode == 'EDIT':
+                    bm = bmesh.from_edit_mesh(mesh)
+                    bm.transform(k)
+                    bmesh.update_edit_mesh(mesh)
+                    count('oriented_vertices', len(bm.verts))
+                else:
+                    mesh.transform(k, shape_keys=True)
+                    mesh.update()
+                    count('oriented_vertices', len(mesh.vertices))
+
+                for obj in group:
+                    obj.matrix_world = Matrix.Translation(obj.matrix_world.to_translation()) @ orientation
+
+        if skipped:
+            self.report({"WARNING"}, '{:d} objects skipped: mesh data is shared with objects of other rotation/scale or not selected'.format(skipped))
 
-        obj.matrix_world = new_mat
-        
 
     def do_measure_edge(self, context):
         obj = bpy.context.active_object
@@ -1097,6 +2811,15 @@ class Recon_Tools(bpy.types.Operator):
             
 
 
+    def do_build_covis(self, context):
+        settings = context.scene.recon_settings
+        cells = build_covis(context.scene, settings)
+        if cells is None:
+            self.report({"ERROR"}, 'Reference mesh "{:s}" or cameras not found'.format(settings.ref_mesh))
+        else:
+            self.report({"INFO"}, 'Covisibility index: {:d} cells'.format(cells))
+
+
     def execute(self, context):        # execute() is called when running the operator.
         # dispatch command
         func = getattr(self, 'do_'+self.cmd)
@@ -1126,6 +2849,16 @@ class Recon_Tools_panel(bpy.types.Panel):
         layout.operator(Recon_Tools.bl_idname, text = 'Set obj orientation').cmd='set_orientation'
         layout.operator(Recon_Tools.bl_idname, text = 'Edge length').cmd='measure_edge'
 
+        layout.separator()
+        layout.label(text='Covisibility index')
+        layout.prop(settings, "covis_resolution")
+        layout.operator(Recon_Tools.bl_idname, text = 'Build index').cmd='build_covis'
+        ref = get_ref_id(settings)
+        if ref is not None and COVIS_PROP in ref:
+            layout.label(text='Cells: {:d}, cameras: {:d}'.format(ref[COVIS_PROP].get('cells', 0), ref[COVIS_PROP].get('cameras', 0)))
+        else:
+            layout.label(text='Not built')
+
 
 #--------------------------
 class Recon_Settings(bpy.types.PropertyGroup):
@@ -1171,6 +2904,47 @@ class Recon_Settings(bpy.types.PropertyGroup):
         default = True
         )
 
+    image_lazy: bpy.props.BoolProperty(
+        name='Load on demand', 
+        description = 'Do not load and pack photos. Store path and load photo when camera becomes active',
+        default = False
+        )
+
+    image_cache_mb: bpy.props.IntProperty(
+        name='Photo cache (MB)', 
+        description = 'Memory for photos loaded on demand. Least recently used photos are unloaded',
+        default = 2048,
+        min=64, 
+        soft_max=16384
+        )
+
+    image_proxy: bpy.props.EnumProperty(
+        name='Preview', 
+        description = 'Show downscaled photo first when loading on demand. Previews are cached on disk',
+        items=[('1', "Full size", ""),
+               ('2', "1/2", ""),
+               ('4', "1/4", ""),
+               ('8', "1/8", ""),
+               ],
+        default = '1'
+        )
+
+    image_proxy_dir: bpy.props.StringProperty(
+        name = 'Preview cache',
+        description = 'Directory for downscaled photos. System temp directory if empty',
+        default = '', 
+        maxlen = 1024, 
+        subtype = 'DIR_PATH'
+        )
+
+    image_threads: bpy.props.IntProperty(
+        name='Read threads', 
+        description = 'Number of threads reading image files',
+        default = 4,
+        min=1, 
+        max=64
+        )
+
     image_selected_only: bpy.props.BoolProperty(
         name="Selected only", 
         description = 'Update only selected cameras',
@@ -1194,6 +2968,22 @@ class Recon_Settings(bpy.types.PropertyGroup):
         update=update_alpha
         )
         
+    nav_full_delay: bpy.props.FloatProperty(
+        name='Full size delay (s)', 
+        description = 'Replace preview with full size photo after this time. 0 - only with Full size button',
+        default = 1.0,
+        min=0, 
+        soft_max=10
+        )
+        
+    nav_prefetch: bpy.props.IntProperty(
+        name='Prefetch', 
+        description = 'Number of photos to read in advance in each direction when loading on demand. 0 - disabled',
+        default = 0,
+        min=0, 
+        max=16
+        )
+        
     nav_center_selected: bpy.props.BoolProperty(
         name="Center selected", 
         default=True,
@@ -1212,6 +3002,28 @@ class Recon_Settings(bpy.types.PropertyGroup):
 #        options={'HIDDEN'} 
         )
         
+    nav_filter_occlusion: bpy.props.BoolProperty(
+        name="Not occluded", 
+        description = 'Selection must not be hidden from camera by reference mesh',
+        default=False,
+        )
+        
+    nav_occlusion_rays: bpy.props.IntProperty(
+        name='Max rays', 
+        description = 'Maximum number of selected points to test per camera',
+        default = 64,
+        min=1, 
+        max=4096
+        )
+        
+    nav_occlusion_min: bpy.props.IntProperty(
+        name='Min visible', 
+        description = 'Number of not occluded points required',
+        default = 1,
+        min=1, 
+        soft_max=64
+        )
+        
     nav_filter_angle_enable: bpy.props.BoolProperty(
         name="Direction filter", 
         description = 'Do not switch to camera if its angle differs more than specified',
@@ -1260,6 +3072,20 @@ class Recon_Settings(bpy.types.PropertyGroup):
         default='none',
         )
         
+    covis_resolution: bpy.props.IntProperty(
+        name='Cells', 
+        description = 'Covisibility index cells along the longest side of reference mesh',
+        default = 64,
+        min=4, 
+        max=512
+        )
+        
+    nav_graph: bpy.props.BoolProperty(
+        name="Reversible", 
+        description = 'Keep nearest cameras for each sort direction. Prev returns exactly to cameras visited with Next',
+        default=False,
+        )
+        
     ref_mesh: bpy.props.StringProperty(
         name = 'Reference model',
         description = 'Reference object or collection to toggle with Ctrl-UP',
@@ -1294,6 +3120,27 @@ class Recon_Settings(bpy.types.PropertyGroup):
         default=True,
         )
         
+    cam_cache: bpy.props.BoolProperty(
+        name="Use cache", 
+        description = 'Save parsed XML next to it as .cache.npz and reuse it while XML is not changed',
+        default=True,
+        )
+        
+    cam_changed_only: bpy.props.BoolProperty(
+        name="Changed only", 
+        description = 'Update only cameras which position or sensor differ from file',
+        default=True,
+        )
+        
+    cam_tolerance: bpy.props.FloatProperty(
+        name='Tolerance', 
+        description = 'Relative difference to treat camera as changed',
+        default = 1e-4,
+        min=0, 
+        soft_max=0.01,
+        precision=6
+        )
+        
     cam_use_current: bpy.props.BoolProperty(
         name="Include current", 
         description = 'Include current camera',
@@ -1303,7 +3150,7 @@ class Recon_Settings(bpy.types.PropertyGroup):
     # ----- LOAD MARKERS -------
     markers_file: bpy.props.StringProperty(
         name = 'File',
-        description = 'Markers XML file',
+        description = 'Markers .csv or .npy file exported by marker_positions.py',
 #        default = os.path.dirname(bpy.data.filepath), 
         maxlen = 1024, 
         subtype = 'FILE_PATH'
@@ -1311,23 +3158,72 @@ class Recon_Settings(bpy.types.PropertyGroup):
 
     markers_replace: bpy.props.BoolProperty(
         name="Replace existing", 
-        description = 'Replace existing markers object',
+        description = 'Remove markers missing in file. Otherwise only add new and move existing markers',
         default=True,
         )
         
     # ----- EXPORT -------
     export_file: bpy.props.StringProperty(
         name = 'File',
-        description = 'Export to',
+        description = 'Export to .obj or .ply (binary) file',
         maxlen = 1024, 
         subtype = 'FILE_PATH'
         )
 
+    export_cache: bpy.props.BoolProperty(
+        name="Cache parts", 
+        description = 'Keep exported objects in <file>.parts folder and only export again objects changed since last export',
+        default=True,
+        )
+
+    export_per_object: bpy.props.BoolProperty(
+        name="One file per object", 
+        description = 'Export each object to its own file named after object in the folder of export file. File extension selects format',
+        default=False,
+        )
+
+    export_workers: bpy.props.IntProperty(
+        name='Workers', 
+        description = 'Number of threads or processes writing object files',
+        default = min(os.cpu_count() or 1, 64),
+        min=1, 
+        max=64
+        )
+
+    export_processes: bpy.props.BoolProperty(
+        name="Use processes", 
+        description = 'Write files in forked worker processes sharing mesh data through shared memory. Scales with CPU cores but forking blender is experimental, Linux/macOS only',
+        default=False,
+        )
+
     export_objects: bpy.props.CollectionProperty(type=bpy.types.PropertyGroup) #Recon_ExportList_item)
     export_list_idx: bpy.props.IntProperty(
 #        default = -1
         )
 
+    # ----- DEBUG -------
+    debug: bpy.props.BoolProperty(
+        name="Instrumentation", 
+        description = 'Print details to console and record timings. Slows down big imports',
+        default=False,
+        update=debug_update
+        )
+        
+    debug_show: bpy.props.IntProperty(
+        name='Show last', 
+        description = 'Number of recent timings to show',
+        default = 10,
+        min=0, 
+        max=100
+        )
+        
+    debug_file: bpy.props.StringProperty(
+        name = 'File',
+        description = 'Export timings to .csv or .json',
+        maxlen = 1024, 
+        subtype = 'FILE_PATH'
+        )
+
     
 
 # -----------------------------------------------------------------
@@ -1347,6 +3243,9 @@ class Recon_ImportCameras_panel(bpy.types.Panel):
         layout.prop(settings, "cam_update")
         layout.prop(settings, "cam_selected_only")
         layout.prop(settings, "cam_use_current")
+        layout.prop(settings, "cam_cache")
+        layout.prop(settings, "cam_changed_only")
+        layout.prop(settings, "cam_tolerance")
 
         layout.separator()
 
@@ -1389,6 +3288,11 @@ class Recon_ImportImages_panel(bpy.types.Panel):
         layout.prop(settings, "image_clean_existing")
         layout.prop(settings, "image_selected_only")
         layout.prop(settings, "image_use_current")
+        layout.prop(settings, "image_threads")
+        layout.prop(settings, "image_lazy")
+        layout.prop(settings, "image_cache_mb")
+        layout.prop(settings, "image_proxy")
+        layout.prop(settings, "image_proxy_dir")
 
         layout.separator()
         layout.prop(settings, "image_replace_f")
@@ -1430,7 +3334,12 @@ class Recon_Nav_panel(bpy.types.Panel):
         layout.prop(settings, "nav_center_selected")
         layout.prop(settings, "nav_hide_other")
         layout.prop(settings, "nav_sort_mode")
+        layout.prop(settings, "nav_graph")
         layout.prop(settings, "nav_filter_visible")
+        layout.prop(settings, "nav_filter_occlusion")
+        row = layout.row()
+        row.prop(settings, "nav_occlusion_rays")
+        row.prop(settings, "nav_occlusion_min")
         layout.separator()
         layout.prop(settings, "nav_filter_distance_enable")
         layout.prop(settings, "nav_filter_distance")
@@ -1447,6 +3356,83 @@ class Recon_Nav_panel(bpy.types.Panel):
         row.operator(Recon_SwitchCamera.bl_idname, text='Next').direction='next'
         layout.operator(Recon_SwitchCamera.bl_idname, text='Show cameras').direction='showcam'
         layout.operator(Recon_SwitchCamera.bl_idname, text='Refresh').direction='refresh'
+        layout.operator(Recon_SwitchCamera.bl_idname, text='Full size photo').direction='fullres'
+        layout.prop(settings, "nav_full_delay")
+        layout.prop(settings, "nav_prefetch")
+        if settings.nav_prefetch:
+            layout.label(text='Prefetch hits: {:d} misses: {:d}'.format(prefetch_stats['hits'], prefetch_stats['misses']))
+
+
+# -----------------------------------------------------------------
+class Recon_Timings(bpy.types.Operator):
+    bl_idname = "reconstruction.timings"
+    bl_label = "Timings"
+
+    cmd: bpy.props.EnumProperty(
+        items=[ ('export', "Export timings", ""),
+                ('clear', "Clear timings", ""),
+               ],
+        name="Command", 
+        default='export',
+        options={'HIDDEN'} 
+        )
+
+    def do_export(self, context):
+        settings = context.scene.recon_settings
+        path = bpy.path.abspath(settings.debug_file)
+        if not path:
+            self.report({"ERROR"}, 'Choose file to export timings')
+            return
+
+        with open(path, 'w', newline='') as f:
+            if path.lower().endswith('.json'):
+                json.dump({'timings': list(timings), 'counters': dict(counters), 'peak_mb': peak_memory()}, f, indent=1)
+            else:
+                wr = csv.writer(f)
+                wr.writerow(['name', 'seconds', 'time', 'peak_mb'])
+                wr.writerows([t['name'], t['seconds'], t['time'], t['peak_mb']] for t in timings)
+                wr.writerows(['counter:'+name, value, '', ''] for name, value in counters.items())
+        self.report({"INFO"}, 'Timings exported: {:d}'.format(len(timings)))
+
+    def do_clear(self, context):
+        timings.clear()
+        counters.clear()
+
+    def execute(self, context):        # execute() is called when running the operator.
+        # dispatch command
+        func = getattr(self, 'do_'+self.cmd)
+        func(context)
+
+        return {'FINISHED'}            # Lets Blender know the operator finished successfully.
+
+
+class Recon_Debug_panel(bpy.types.Panel):
+    bl_label = "Instrumentation"
+    bl_category = "Photo Reconstruction"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+
+        settings = context.scene.recon_settings
+        layout.prop(settings, "debug")
+        layout.prop(settings, "debug_show")
+
+        col = layout.column(align=True)
+        for t in list(timings)[-settings.debug_show:] if settings.debug_show else []:
+            col.label(text='{:s}: {:.1f} ms'.format(t['name'], t['seconds']*1000))
+        for name, value in counters.items():
+            col.label(text='{:s}: {:d}'.format(name, value))
+        peak = peak_memory()
+        if peak is not None:
+            col.label(text='Peak memory: {:.0f} MB'.format(peak))
+
+        layout.prop(settings, "debug_file")
+        row = layout.row()
+        row.operator(Recon_Timings.bl_idname, text='Export').cmd='export'
+        row.operator(Recon_Timings.bl_idname, text='Clear').cmd='clear'
 
 
 # -----------------------------------------------------------------
@@ -1485,6 +3471,7 @@ classes = ( Recon_SwitchCamera, Recon_TogglePhoto, Recon_ToggleMesh,
             Recon_Export, Recon_List_items, Recon_Export_panel,
             Recon_Orientations,
             Recon_Tools, Recon_Tools_panel,
+            Recon_Timings, Recon_Debug_panel,
             Recon_Menu)
 
 
@@ -1529,39 +3516,60 @@ def register():
 
     bpy.types.VIEW3D_MT_view.append(draw_menu)
 
+    bpy.app.handlers.depsgraph_update_post.append(recon_depsgraph_update)
+    bpy.app.handlers.load_post.append(recon_load_post)
+    bpy.app.handlers.undo_post.append(recon_undo_post)
+    bpy.app.handlers.redo_post.append(recon_undo_post)
+
     wm = bpy.context.window_manager
+    kc = wm.keyconfigs.addon
+    # no addon keyconfig in background mode
+    if not kc:
+        return
 
-    km = wm.keyconfigs.addon.keymaps.new(name = "Window",space_type='EMPTY', region_type='WINDOW')
+    km = kc.keymaps.new(name = "Window",space_type='EMPTY', region_type='WINDOW')
     kmi = km.keymap_items.new(Recon_SwitchCamera.bl_idname, 'RIGHT_ARROW', 'PRESS', ctrl=True, shift=False)
     kmi.properties.direction='next'
     addon_keymaps.append((km, kmi))
 
-    km = wm.keyconfigs.addon.keymaps.new(name = "Window",space_type='EMPTY', region_type='WINDOW')
+    km = kc.keymaps.new(name = "Window",space_type='EMPTY', region_type='WINDOW')
     kmi = km.keymap_items.new(Recon_SwitchCamera.bl_idname, 'LEFT_ARROW', 'PRESS', ctrl=True, shift=False)
     kmi.properties.direction='prev'
     addon_keymaps.append((km, kmi))
 
-    km = wm.keyconfigs.addon.keymaps.new(name = "Window",space_type='EMPTY', region_type='WINDOW')
+    km = kc.keymaps.new(name = "Window",space_type='EMPTY', region_type='WINDOW')
     kmi = km.keymap_items.new(Recon_TogglePhoto.bl_idname, 'DOWN_ARROW', 'PRESS', ctrl=True, shift=False)
     addon_keymaps.append((km, kmi))
 
-    km = wm.keyconfigs.addon.keymaps.new(name = "Window",space_type='EMPTY', region_type='WINDOW')
+    km = kc.keymaps.new(name = "Window",space_type='EMPTY', region_type='WINDOW')
     kmi = km.keymap_items.new(Recon_ToggleMesh.bl_idname, 'UP_ARROW', 'PRESS', ctrl=True, shift=False)
     addon_keymaps.append((km, kmi))
 
-    km = wm.keyconfigs.addon.keymaps.new(name = "Window",space_type='EMPTY', region_type='WINDOW')
+    km = kc.keymaps.new(name = "Window",space_type='EMPTY', region_type='WINDOW')
     kmi = km.keymap_items.new(Recon_Orientations.bl_idname, 'HOME', 'PRESS', ctrl=False, shift=True)
     kmi.properties.cmd='switch'
     addon_keymaps.append((km, kmi))
 
 
 def unregister():
+    global prefetch_pool
     for km, kmi in addon_keymaps:
         km.keymap_items.remove(kmi)
     addon_keymaps.clear()
 
     bpy.types.VIEW3D_MT_view.remove(draw_menu)
 
+    bpy.app.handlers.depsgraph_update_post.remove(recon_depsgraph_update)
+    bpy.app.handlers.load_post.remove(recon_load_post)
+    bpy.app.handlers.undo_post.remove(recon_undo_post)
+    bpy.app.handlers.redo_post.remove(recon_undo_post)
+
+    if prefetch_timer and bpy.app.timers.is_registered(prefetch_timer):
+        bpy.app.timers.unregister(prefetch_timer)
+    if prefetch_pool:
+        prefetch_pool.shutdown(wait=False)
+        prefetch_pool = None
+
     for cls in classes:
         bpy.utils.unregister_class(cls)
     
@@ -0,0 +1,318 @@
+"""Synthetic benchmark for Photo Reconstruction Tools
+
+Generates PhotoScan cameras XML, markers CSV, dummy photos and reference mesh,
+times import, navigation and export operators and writes results to JSON.
+
+Usage:
+    blender --background --python benchmark.py -- --cameras 100 1000 10000 50000 --out bench.json
+"""
+import bpy
+import numpy as np
+import argparse
+import importlib.util
+import json
+import math
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+
+ADDON_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Photo_Reconstruction_Tools.py')
+
+SORT_MODES = ['none', 'distance', 'camx', 'camy', 'camz']
+
+# name: settings to enable, everything else in FILTER_KEYS is disabled
+FILTERS = {
+    'none': {},
+    'visible': {'nav_filter_visible': True},
+    'distance': {'nav_filter_distance_enable': True},
+    'angle': {'nav_filter_angle_enable': True},
+    'occlusion': {'nav_filter_visible': True, 'nav_filter_occlusion': True},
+    'all': {'nav_filter_visible': True, 'nav_filter_distance_enable': True, 'nav_filter_angle_enable': True},
+    }
+FILTER_KEYS = ['nav_filter_visible', 'nav_filter_occlusion', 'nav_filter_distance_enable', 'nav_filter_angle_enable']
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index('--')+1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(prog='blender --background --python benchmark.py --')
+    parser.add_argument('--cameras', type=int, nargs='+', default=[100, 1000, 10000, 50000], help='camera counts to test')
+    parser.add_argument('--chunks', type=int, default=1)
+    parser.add_argument('--groups', type=int, default=4, help='camera groups per chunk')
+    parser.add_argument('--sensors', type=int, default=2, help='sensors per chunk')
+    parser.add_argument('--markers', type=int, default=1000)
+    parser.add_argument('--image-size', type=int, nargs=2, default=[64, 48])
+    parser.add_argument('--mesh-segments', type=int, default=128, help='reference sphere segments')
+    parser.add_argument('--switches', type=int, default=10, help='navigation presses per direction')
+    parser.add_argument('--skip', nargs='*', default=[], choices=['images', 'markers', 'navigation', 'export'])
+    parser.add_argument('--workdir', default='', help='directory for generated data, temporary if empty')
+    parser.add_argument('--out', default='benchmark.json')
+    return parser.parse_args(argv)
+
+
+# -----------------------------------------------------------------
+# Synthetic data
+def camera_transforms(n, radius):
+    """Cameras on a spiral around origin looking at it. PhotoScan camera looks along +Z with Y down"""
+    t = np.arange(n) + 0.5
+    z = 1.0 - t / n * 1.6
+    a = t * math.pi * (3.0 - math.sqrt(5.0))
+    pos = np.stack((np.cos(a) * np.sqrt(1 - z*z), np.sin(a) * np.sqrt(1 - z*z), z), axis=1) * radius
+
+    forward = -pos / np.linalg.norm(pos, axis=1)[:, None]
+    right = np.cross(forward, (0.0, 0.0, 1.0))
+    right /= np.linalg.norm(right, axis=1)[:, None]
+    down = np.cross(forward, right)
+
+    m = np.zeros((n, 4, 4))
+    m[:, :3, 0] = right
+    m[:, :3, 1] = down
+    m[:, :3, 2] = forward
+    m[:, :3, 3] = pos
+    m[:, 3, 3] = 1
+    return m
+
+
+def write_cameras_xml(path, args, n):
+    """Returns camera labels"""
+    w, h = args.image_size
+    labels = []
+    per_chunk = [len(c) for c in np.array_split(np.arange(n), args.chunks)]
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<document version="1.4.0">\n')
+        for c, count in enumerate(per_chunk):
+            f.write('  <chunk label="Chunk {:d}" enabled="true">\n    <sensors>\n'.format(c+1))
+            for s in range(args.sensors):
+                f.write('      <sensor id="{:d}" label="sensor {:d}" type="frame">\n'.format(s, s))
+                f.write('        <resolution width="{:d}" height="{:d}"/>\n'.format(w, h))
+                f.write('        <calibration type="frame" class="adjusted">\n')
+                f.write('          <resolution width="{:d}" height="{:d}"/>\n'.format(w, h))
+                f.write('          <f>{:f}</f>\n        </calibration>\n      </sensor>\n'.format(w * (0.8 + 0.1*s)))
+            f.write('    </sensors>\n    <cameras>\n')
+
+            transforms = camera_transforms(count, 10.0)
+            groups = np.array_split(np.arange(count), args.groups + 1)
+            for g, index in enumerate(groups):
+                # last part is left ungrouped
+                grouped = g < args.groups
+                if grouped:
+                    f.write('      <group id="{:d}" label="Group {:d}-{:d}" type="folder">\n'.format(g, c+1, g+1))
+                for i in index:
+                    label = 'C{:d}_IMG_{:06d}'.format(c+1, i)
+                    labels.append(label)
+                    f.write('        <camera id="{:d}" label="{:s}" sensor_id="{:d}" enabled="true">\n'.format(i, label, i % args.sensors))
+                    f.write('          <transform>{:s}</transform>\n'.format(' '.join('{:.9f}'.format(v) for v in transforms[i].ravel())))
+                    f.write('          <orientation>{:s}</orientation>\n'.format('6' if i % 10 == 0 else '1'))
+                    f.write('        </camera>\n')
+                if grouped:
+                    f.write('      </group>\n')
+
+            f.write('    </cameras>\n    <markers/>\n')
+            f.write('    <transform>\n      <rotation>1 0 0 0 1 0 0 0 1</rotation>\n')
+            f.write('      <translation>0 0 0</translation>\n      <scale>1</scale>\n    </transform>\n')
+            f.write('  </chunk>\n')
+        f.write('</document>\n')
+    return labels
+
+
+def write_markers_csv(path, count):
+    rng = np.random.default_rng(1)
+    co = rng.normal(size=(count, 3))
+    co *= 2.0 / np.linalg.norm(co, axis=1)[:, None]
+    with open(path, 'w') as f:
+        f.write(''.join('marker {:d},{:f},{:f},{:f}\n'.format(i, *p) for i, p in enumerate(co)))
+
+
+def png_bytes(w, h, shade):
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+    row = b'\x00' + bytes((shade, shade, shade)) * w
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * h))
+            + chunk(b'IEND', b''))
+
+
+def write_images(path, labels, size):
+    os.makedirs(path, exist_ok=True)
+    for i, label in enumerate(labels):
+        with open(os.path.join(path, label + '.png'), 'wb') as f:
+            f.write(png_bytes(size[0], size[1], i % 256))
+
+
+def create_reference_mesh(name, segments, radius=2.0):
+    """UV sphere built from arrays so it does not depend on bmesh.ops arguments of blender version"""
+    rings = segments // 2
+    phi = np.linspace(0, math.pi, rings + 1)[1:-1]
+    theta = np.linspace(0, 2*math.pi, segments, endpoint=False)
+    co = np.stack((np.outer(np.sin(phi), np.cos(theta)).ravel(),
+                   np.outer(np.sin(phi), np.sin(theta)).ravel(),
+                   np.repeat(np.cos(phi), segments)), axis=1) * radius
+    co = np.vstack((co, (0, 0, radius), (0, 0, -radius)))
+    top, bottom = len(co) - 2, len(co) - 1
+
+    faces = []
+    for r in range(rings - 2):
+        for s in range(segments):
+            a = r*segments + s
+            b = r*segments + (s+1) % segments
+            faces.append((a, b, b + segments, a + segments))
+    for s in range(segments):
+        faces.append((top, (s+1) % segments, s))
+        last = (rings - 2) * segments
+        faces.append((bottom, last + s, last + (s+1) % segments))
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(co.tolist(), [], faces)
+    mesh.update()
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+
+def select_vertices(obj, fraction=0.02):
+    """Select a patch of vertices facing +X"""
+    verts = obj.data.vertices
+    co = np.empty(len(verts)*3, dtype=np.float32)
+    verts.foreach_get('co', co)
+    co = co.reshape((-1, 3))
+    select = co[:, 0] >= np.quantile(co[:, 0], 1.0 - fraction)
+    verts.foreach_set('select', select)
+    obj.data.update()
+    bpy.context.view_layer.objects.active = obj
+    obj.select_set(True)
+    return int(select.sum())
+
+
+def reset_scene():
+    for collection in [bpy.data.objects, bpy.data.meshes, bpy.data.cameras, bpy.data.images, bpy.data.collections]:
+        for item in list(collection):
+            collection.remove(item)
+
+
+# -----------------------------------------------------------------
+def timed(results, name, func):
+    start = time.perf_counter()
+    try:
+        res = func()
+        results[name] = {'seconds': time.perf_counter() - start, 'result': sorted(res) if isinstance(res, set) else res}
+    except Exception as e:
+        results[name] = {'seconds': time.perf_counter() - start, 'error': str(e)}
+    print('{:s}: {:s}'.format(name, str(results[name])))
+    return results[name]
+
+
+def time_navigation(settings, switches):
+    """Per press timings of Next presses followed by the same number of Prev presses"""
+    presses = []
+    for direction in ['next', 'prev']:
+        for i in range(switches):
+            start = time.perf_counter()
+            bpy.ops.reconstruction.switch_cam(direction=direction)
+            presses.append(time.perf_counter() - start)
+    return {'mean': float(np.mean(presses)), 'min': float(np.min(presses)), 'max': float(np.max(presses)), 'presses': len(presses)}
+
+
+def run(args, n, workdir):
+    results = {}
+    reset_scene()
+    scene = bpy.context.scene
+    settings = scene.recon_settings
+
+    data = os.path.join(workdir, str(n))
+    os.makedirs(data, exist_ok=True)
+    xml = os.path.join(data, 'cameras.xml')
+    start = time.perf_counter()
+    labels = write_cameras_xml(xml, args, n)
+    results['generate_xml'] = {'seconds': time.perf_counter() - start}
+
+    mesh = create_reference_mesh(settings.ref_mesh, args.mesh_segments)
+
+    settings.cam_file = xml
+    settings.cam_append = True
+    settings.cam_update = True
+    # nothing is selected, second import has to update all cameras
+    settings.cam_selected_only = False
+    timed(results, 'import_cameras', lambda: bpy.ops.reconstruction.load_camera())
+    timed(results, 'import_cameras_update', lambda: bpy.ops.reconstruction.load_camera())
+    if not scene.camera:
+        scene.camera = scene.objects.get(labels[0])
+
+    if not 'images' in args.skip:
+        images = os.path.join(data, 'images')
+        timed(results, 'generate_images', lambda: write_images(images, labels, args.image_size))
+        settings.image_path = images
+        settings.image_ext = '.png'
+        settings.image_selected_only = False
+        settings.image_clean_existing = True
+        settings.image_replace_existing = True
+        settings.image_lazy = False
+        timed(results, 'import_images', lambda: bpy.ops.reconstruction.load_image())
+        settings.image_lazy = True
+        timed(results, 'import_images_lazy', lambda: bpy.ops.reconstruction.load_image())
+
+    if not 'markers' in args.skip:
+        markers = os.path.join(data, 'markers.csv')
+        write_markers_csv(markers, args.markers)
+        settings.markers_file = markers
+        timed(results, 'import_markers', lambda: bpy.ops.reconstruction.load_markers())
+
+    if not 'navigation' in args.skip:
+        results['selected_vertices'] = select_vertices(mesh)
+        settings.nav_hide_other = False
+        settings.nav_center_selected = False
+        settings.nav_prefetch = 0
+        timed(results, 'build_covis', lambda: bpy.ops.reconstruction.tools(cmd='build_covis'))
+        for graph in [False, True]:
+            settings.nav_graph = graph
+            for sort in SORT_MODES:
+                settings.nav_sort_mode = sort
+                for name, enable in FILTERS.items():
+                    for key in FILTER_KEYS:
+                        setattr(settings, key, enable.get(key, False))
+                    scene.camera = scene.objects.get(labels[0])
+                    label = 'switch_camera/{:s}/{:s}/{:s}'.format('graph' if graph else 'scan', sort, name)
+                    timed(results, label, lambda: time_navigation(settings, args.switches))
+
+    if not 'export' in args.skip:
+        settings.export_file = os.path.join(data, 'export.obj')
+        settings.export_objects.clear()
+        settings.export_objects.add().name = mesh.name
+        bpy.context.view_layer.objects.active = mesh
+        timed(results, 'export', lambda: bpy.ops.reconstruction.export(cmd='export'))
+
+    return results
+
+
+def main():
+    args = parse_args()
+
+    spec = importlib.util.spec_from_file_location('Photo_Reconstruction_Tools', ADDON_FILE)
+    addon = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(addon)
+    addon.register()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='recon_bench_')
+    report = {
+        'blender': bpy.app.version_string,
+        'addon_version': list(addon.bl_info['version']),
+        'args': vars(args),
+        'workdir': workdir,
+        'runs': [],
+        }
+    try:
+        for n in args.cameras:
+            print('=== {:d} cameras ==='.format(n))
+            report['runs'].append({'cameras': n, 'timings': run(args, n, workdir)})
+    finally:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print('Results written to {:s}'.format(os.path.abspath(args.out)))
+        addon.unregister()
+
+
+if __name__ == '__main__':
+    main()
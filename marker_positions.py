@@ -1,13 +1,38 @@
 import PhotoScan
+import struct
 
-file_path = PhotoScan.app.getSaveFileName("Specify project filename for saving: ")
-f = open(file_path, "w")
+# .npy file fields: chunk label, marker label, position, number of marker projections
+NPY_DESCR = "[('chunk', 'S64'), ('label', 'S64'), ('pos', '<f8', (3,)), ('projections', '<i4')]"
+NPY_RECORD = struct.Struct('<64s64s3di')
+
+def npy_header(count):
+    header = "{{'descr': {:s}, 'fortran_order': False, 'shape': ({:d},), }}".format(NPY_DESCR, count)
+    # magic + version + header length + header padded with spaces and '\n' to 64 bytes
+    header += ' ' * (-(len(header) + 11) % 64) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+file_path = PhotoScan.app.getSaveFileName("Specify markers file (.csv or .npy): ")
+binary = file_path.lower().endswith('.npy')
+
+lines = []
+records = []
 for chunk in PhotoScan.app.document.chunks:
     for marker in chunk.markers:
         if None == marker.position:
             continue
         pos = chunk.transform.matrix.mulp(marker.position)
-        s = "{:s},{:f},{:f},{:f}\n".format(marker.label, pos.x, pos.y, pos.z)
-        print(s)
-        f.write(s)
-f.close()
+        if binary:
+            records.append(NPY_RECORD.pack(chunk.label.encode('utf-8')[:64], marker.label.encode('utf-8')[:64],
+                                           pos.x, pos.y, pos.z, len(marker.projections)))
+        else:
+            lines.append("{:s},{:f},{:f},{:f}\n".format(marker.label, pos.x, pos.y, pos.z))
+
+# single buffered write
+if binary:
+    with open(file_path, "wb") as f:
+        f.write(npy_header(len(records)) + b''.join(records))
+else:
+    with open(file_path, "w") as f:
+        f.write(''.join(lines))
+print('Markers exported: {:d}'.format(len(records) + len(lines)))
@@ -0,0 +1,145 @@
+"""Command line import of cameras, photos and markers and quick export without UI
+
+Usage:
+    blender --background [site.blend] --python recon_batch.py -- --xml cameras.xml --images photos/ \
+        --markers markers.csv --export model.obj --objects mesh1 --save site_out.blend
+
+Exit status is 0 when all requested steps succeeded, 1 otherwise. A step also
+fails when it imported nothing or some of the items failed.
+"""
+import bpy
+import argparse
+import importlib.util
+import os
+import sys
+import traceback
+
+
+ADDON_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Photo_Reconstruction_Tools.py')
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index('--')+1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(prog='blender --background --python recon_batch.py --')
+    parser.add_argument('--xml', help='PhotoScan cameras XML')
+    parser.add_argument('--images', help='directory with undistorted photos')
+    parser.add_argument('--ext', default='.jpg', help='photo file extension')
+    parser.add_argument('--lazy', action='store_true', help='store photo paths and load photos on demand instead of packing')
+    parser.add_argument('--markers', help='markers .csv or .npy exported by marker_positions.py')
+    parser.add_argument('--export', help='quick export file')
+    parser.add_argument('--objects', nargs='*', default=[], help='objects to export')
+    parser.add_argument('--per-object', action='store_true', help='export each object to its own file in the folder of --export')
+    parser.add_argument('--processes', action='store_true', help='write --per-object files in forked worker processes')
+    parser.add_argument('--ref-mesh', help='reference object or collection name')
+    parser.add_argument('--save', help='save resulting .blend file')
+    return parser.parse_args(argv)
+
+
+def register_addon():
+    if hasattr(bpy.types.Scene, 'recon_settings') and 'Photo_Reconstruction_Tools' in sys.modules:
+        return sys.modules['Photo_Reconstruction_Tools']
+    spec = importlib.util.spec_from_file_location('Photo_Reconstruction_Tools', ADDON_FILE)
+    addon = importlib.util.module_from_spec(spec)
+    # worker processes of per object export find addon functions by module name
+    sys.modules[spec.name] = addon
+    spec.loader.exec_module(addon)
+    addon.register()
+    return addon
+
+
+def run_step(name, func, counters=None, check=None):
+    """Run operator, False if it failed or check(counters) of the step returns problem text"""
+    print('--- {:s}'.format(name))
+    if counters is not None:
+        counters.clear()
+    try:
+        res = func()
+    except Exception:
+        traceback.print_exc()
+        return False
+    if not 'FINISHED' in res:
+        print('{:s}: {:s}'.format(name, str(res)))
+        return False
+    problem = check(counters) if check else None
+    if problem:
+        print('{:s}: {:s}'.format(name, problem))
+        return False
+    return True
+
+
+def check_cameras(counters):
+    if not counters['cameras_created'] + counters['cameras_set_up'] + counters['cameras_unchanged']:
+        return 'no cameras imported'
+
+
+def check_images(counters):
+    if counters['images_failed']:
+        return '{:d} images failed'.format(counters['images_failed'])
+    if not counters['images_loaded']:
+        return 'no images loaded'
+
+
+def check_markers(counters):
+    if not counters['markers']:
+        return 'no markers imported'
+
+
+def check_export(counters):
+    if counters['export_failed']:
+        return 'export failed'
+
+
+def main():
+    args = parse_args()
+    counters = register_addon().counters
+
+    scene = bpy.context.scene
+    settings = scene.recon_settings
+    if args.ref_mesh:
+        settings.ref_mesh = args.ref_mesh
+
+    ok = True
+    if args.xml:
+        settings.cam_file = os.path.abspath(args.xml)
+        settings.cam_append = True
+        settings.cam_update = True
+        settings.cam_selected_only = False
+        ok &= run_step('import cameras', lambda: bpy.ops.reconstruction.load_camera(), counters, check_cameras)
+
+    if args.images:
+        settings.image_path = os.path.abspath(args.images)
+        settings.image_ext = args.ext
+        settings.image_selected_only = False
+        settings.image_lazy = args.lazy
+        ok &= run_step('import images', lambda: bpy.ops.reconstruction.load_image(), counters, check_images)
+
+    if args.markers:
+        settings.markers_file = os.path.abspath(args.markers)
+        ok &= run_step('import markers', lambda: bpy.ops.reconstruction.load_markers(), counters, check_markers)
+
+    if args.export:
+        settings.export_file = os.path.abspath(args.export)
+        settings.export_per_object = args.per_object
+        settings.export_processes = args.processes
+        if args.objects:
+            settings.export_objects.clear()
+            for name in args.objects:
+                if not name in scene.objects:
+                    print('Export object not found: {:s}'.format(name))
+                    ok = False
+                settings.export_objects.add().name = name
+        if not settings.export_objects:
+            print('Nothing to export, use --objects')
+            ok = False
+        else:
+            ok &= run_step('export', lambda: bpy.ops.reconstruction.export(cmd='export'), counters, check_export)
+
+    if args.save:
+        ok &= run_step('save', lambda: bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(args.save)))
+
+    print('Done' if ok else 'Failed')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()